@@ -0,0 +1,199 @@
+"""
+Content-addressed store for source and asset results.
+
+Objects are pickled and stored under their sha256, refs map a key (a source
+name, or an asset name plus the versions of its sources) to an object and
+when it was published. The store can sit on a shared filesystem so results
+built by the nightly job are pulled by everyone else instead of rebuilt.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+
+from utils import (
+    ARTIFACT_MAX_AGE,
+    ARTIFACT_STORE,
+    atomic_write,
+    file_lock,
+    single_flight,
+)
+
+
+class DirectoryBackend:
+    """Artifacts in a local directory or a shared filesystem path"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def read(self, path):
+        try:
+            with open(os.path.join(self.root, path), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, path, data):
+        # write then rename, so readers never see a partial file
+        with atomic_write(os.path.join(self.root, path)) as f:
+            f.write(data)
+
+    def exists(self, path):
+        return os.path.exists(os.path.join(self.root, path))
+
+    def list(self, prefix):
+        for dirpath, _, files in os.walk(os.path.join(self.root, prefix)):
+            for fname in files:
+                yield os.path.relpath(os.path.join(dirpath, fname), self.root)
+
+    def remove(self, path):
+        os.remove(os.path.join(self.root, path))
+
+    def lock(self, name):
+        return file_lock(name, directory=os.path.join(self.root, "locks"))
+
+
+BACKENDS = {
+    "file": DirectoryBackend,
+}
+
+
+def backend_from_spec(spec):
+    """'file:///shared/databank' or a plain path"""
+    scheme, sep, location = spec.partition("://")
+    if not sep:
+        scheme, location = "file", spec
+    return BACKENDS[scheme](location)
+
+
+class ArtifactStore:
+    def __init__(self, backend, max_age=ARTIFACT_MAX_AGE):
+        self.backend = backend
+        self.max_age = max_age
+        self.refreshing = {}
+
+    @staticmethod
+    def object_path(digest):
+        return os.path.join("objects", digest[:2], digest[2:])
+
+    @staticmethod
+    def ref_path(key):
+        return os.path.join("refs", f"{key}.json")
+
+    def ref(self, key, max_age=None):
+        """The ref for key, if it was published within max_age seconds"""
+        if key is None:
+            return None
+        data = self.backend.read(self.ref_path(key))
+        if data is None:
+            return None
+        ref = json.loads(data)
+        max_age = self.max_age if max_age is None else max_age
+        if time.time() - ref["published"] > max_age:
+            return None
+        return ref
+
+    def fetch(self, key, max_age=None):
+        ref = self.ref(key, max_age)
+        if ref is None:
+            return None
+        data = self.backend.read(self.object_path(ref["digest"]))
+        if data is None:
+            return None
+        logging.info(f"Artifact {key} from {ref['published_at']}")
+        return pickle.loads(data)
+
+    def publish(self, key, obj):
+        if key is None:
+            return None
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.backend.exists(self.object_path(digest)):
+            self.backend.write(self.object_path(digest), data)
+        now = time.time()
+        ref = {
+            "digest": digest,
+            "size": len(data),
+            "published": now,
+            "published_at": datetime.datetime.fromtimestamp(now).isoformat(),
+        }
+        self.backend.write(self.ref_path(key), json.dumps(ref).encode())
+        return digest
+
+    def get_or_build(
+        self, key, build, max_age=None, stale_window=None, on_refresh=None
+    ):
+        """
+        Fetch key, or build and publish it. Concurrent builders of the same key
+        queue on a lock in the store and take the result published meanwhile.
+
+        With stale_window (seconds), an artifact too old for max_age but within
+        the window is returned at once and rebuilt in a background thread,
+        which passes the new version to on_refresh once published.
+        """
+        obj = self.fetch(key, max_age)
+        if obj is not None:
+            return obj
+        if stale_window:
+            obj = self.fetch(key, stale_window)
+            if obj is not None:
+                logging.info(f"Artifact {key} is stale, refreshing in background")
+                self.refresh(key, build, max_age, on_refresh)
+                return obj
+        return self.build(key, build, max_age)
+
+    def refresh(self, key, build, max_age=None, on_refresh=None):
+        if key in self.refreshing and self.refreshing[key].is_alive():
+            return self.refreshing[key]
+
+        def target():
+            try:
+                obj = self.build(key, build, max_age)
+            except Exception:
+                logging.exception(f"Background refresh of {key} failed")
+            else:
+                if on_refresh is not None:
+                    on_refresh(obj)
+
+        # not a daemon, so a CLI run finishes publishing before it exits
+        thread = threading.Thread(target=target, name=f"refresh-{key}")
+        self.refreshing[key] = thread
+        thread.start()
+        return thread
+
+    def build(self, key, build, max_age=None):
+        def build_and_publish():
+            obj = build()
+            self.publish(key, obj)
+            return obj
+
+        return single_flight(
+            key,
+            build_and_publish,
+            lock=self.backend.lock(key),
+            take=lambda: self.fetch(key, max_age),
+        )
+
+    def prune(self):
+        """Remove objects no ref points to"""
+        live = set()
+        for path in self.backend.list("refs"):
+            if path.endswith(".tmp"):
+                continue
+            live.add(json.loads(self.backend.read(path))["digest"])
+        removed = 0
+        for path in self.backend.list("objects"):
+            if path.endswith(".tmp"):
+                continue  # being published
+            digest = "".join(path.split(os.sep)[-2:])
+            if digest not in live:
+                self.backend.remove(path)
+                removed += 1
+        return removed
+
+
+ARTIFACTS = ArtifactStore(backend_from_spec(ARTIFACT_STORE))
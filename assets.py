@@ -19,6 +19,9 @@ SummaryReport = models.Report(
 ASSETS = (
     turn2us.Turn2usProportional,
     imd.IMD_LA,
+    imd.IMD_LSOA,
+    imd.IMD_LTLA,
+    imd.IMD_UTLA,
     census.ETHNICITY_LA,
     census.AGE_SEX_LA,
     census.POP_LA,
@@ -28,10 +31,14 @@ ASSETS = (
     charity_comission.CC_HISTORY,
     charity_comission.CC_GRANTMAKER,
     charity_comission.CC_HISTORY_AREA,
+    charity_comission.CC_CATEGORY_AREA,
     charity_comission.LVL_UP_AREA_HISTORY,
     charity_comission.LVL_UP_AREA_HISTORY_CHART,
     charity_comission.CC_ACTIVE,
+    charity_comission.CC_FAMILIES,
     charity_comission.CC_BY_AREA,
+    charity_comission.CC_AREA_MONTHLY,
+    charity_comission.CC_SEARCH,
     charity_comission.N_CHARITIES_UTLA,
     charity_comission.NCharitiesUTLAPerHead,
     charity_comission.CharitySpendDensityHex,
@@ -0,0 +1,101 @@
+"""
+Local SQLite catalog with one record per version of each source.
+
+Records are written whenever a source is loaded, so status reports and
+expected update dates can be answered without loading any data.
+"""
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+from utils import CACHE_DIR
+
+CATALOG_PATH = os.path.join(CACHE_DIR, "catalog.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS source_versions (
+    source TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    recorded_at TEXT NOT NULL,
+    publish_date TEXT,
+    latest_date TEXT,
+    update_freq_days REAL,
+    expected_lag_days REAL,
+    row_count INTEGER,
+    byte_size INTEGER,
+    fetch_seconds REAL,
+    schema TEXT,
+    probe TEXT,
+    PRIMARY KEY (source, content_hash)
+)
+"""
+
+
+def connect():
+    os.makedirs(os.path.dirname(CATALOG_PATH), exist_ok=True)
+    con = sqlite3.connect(CATALOG_PATH, timeout=30)
+    con.row_factory = sqlite3.Row
+    con.execute(SCHEMA)
+    columns = [row["name"] for row in con.execute("PRAGMA table_info(source_versions)")]
+    if "probe" not in columns:
+        con.execute("ALTER TABLE source_versions ADD COLUMN probe TEXT")
+    return con
+
+
+def _iso(timestamp):
+    return timestamp.isoformat() if timestamp else None
+
+
+def _days(delta):
+    return delta / pd.Timedelta("1 day") if delta else None
+
+
+def record(
+    name, df, dateMeta, content_hash, byte_size=None, fetch_seconds=None, probe=None
+):
+    """Add a version of a source, or mark an already recorded one as latest"""
+    schema = {col: str(dtype) for col, dtype in df.dtypes.items()}
+    row = (
+        name,
+        content_hash,
+        pd.Timestamp.now().isoformat(),
+        _iso(dateMeta.publish_date),
+        _iso(dateMeta.latest_date),
+        _days(dateMeta.update_freq),
+        _days(dateMeta.expected_lag),
+        len(df),
+        byte_size,
+        fetch_seconds,
+        json.dumps(schema),
+        probe,
+    )
+    with connect() as con:
+        con.execute(
+            """
+            INSERT INTO source_versions VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
+            ON CONFLICT (source, content_hash) DO UPDATE SET
+                recorded_at = excluded.recorded_at,
+                probe = coalesce(excluded.probe, probe)
+            """,
+            row,
+        )
+
+
+def latest_versions():
+    """Source name -> its most recently recorded version"""
+    with connect() as con:
+        rows = con.execute(
+            "SELECT * FROM source_versions ORDER BY recorded_at"
+        ).fetchall()
+    return {row["source"]: dict(row) for row in rows}
+
+
+def versions(name):
+    with connect() as con:
+        rows = con.execute(
+            "SELECT * FROM source_versions WHERE source = ? ORDER BY recorded_at",
+            (name,),
+        ).fetchall()
+    return [dict(row) for row in rows]
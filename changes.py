@@ -0,0 +1,140 @@
+"""
+Change capture between successive versions of a frame keyed on an id column.
+
+Charity Commission extracts are full copies of the register, although few
+charities change between them. diff compares two versions key by key, using a
+hash of each key's rows, and returns the inserted, updated and removed rows.
+Sources with a change_key keep their previous version here so each new one is
+diffed as it is loaded, and incremental_totals keeps additive aggregates in
+step with a frame by regrouping only the keys that changed.
+"""
+import json
+import logging
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import slugify
+
+from utils import CACHE_DIR, atomic_write, to_pickle_atomic
+
+CHANGES_DIR = os.path.join(CACHE_DIR, "changes")
+
+
+@dataclass
+class Delta:
+    inserted: pd.DataFrame  # rows of keys only in the new version
+    updated: pd.DataFrame  # new rows of keys whose rows changed
+    previous: pd.DataFrame  # old rows of those keys
+    removed: pd.DataFrame  # rows of keys only in the old version
+
+    def __len__(self):
+        return len(self.inserted) + len(self.updated) + len(self.removed)
+
+    def summary(self):
+        return (
+            f"{len(self.inserted)} inserted, {len(self.updated)} updated, "
+            f"{len(self.removed)} removed rows"
+        )
+
+
+def key_hashes(df, key):
+    """Series of key -> hash of that key's rows, independent of row order"""
+    rows = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    keys = df[key].to_numpy()
+    order = np.argsort(keys, kind="stable")
+    keys, rows = keys[order], rows[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else []
+    # uint64 addition wraps, so the sum is a hash of the key's set of rows
+    return pd.Series(np.add.reduceat(rows, starts) if len(keys) else rows, keys[starts])
+
+
+def diff(old, new, key):
+    """Inserted, updated and removed rows from old to new, by key"""
+    old_hashes = key_hashes(old, key)
+    new_hashes = key_hashes(new, key)
+    common = old_hashes.index.intersection(new_hashes.index)
+    changed = common[old_hashes[common].to_numpy() != new_hashes[common].to_numpy()]
+    inserted = new_hashes.index.difference(old_hashes.index)
+    removed = old_hashes.index.difference(new_hashes.index)
+    return Delta(
+        inserted=new[new[key].isin(inserted)],
+        updated=new[new[key].isin(changed)],
+        previous=old[old[key].isin(changed)],
+        removed=old[old[key].isin(removed)],
+    )
+
+
+def state_dir(name):
+    return os.path.join(CHANGES_DIR, slugify.slugify(name))
+
+
+def read_state(name):
+    try:
+        with open(os.path.join(state_dir(name), "state.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_state(name, state):
+    with atomic_write(os.path.join(state_dir(name), "state.json"), "w") as f:
+        json.dump(state, f)
+
+
+def capture(name, df, key, version):
+    """
+    Diff version of a source with the one previously captured and keep it as
+    the new previous one. Returns the Delta, or None for the first version or
+    one already captured.
+    """
+    directory = state_dir(name)
+    state = read_state(name)
+    if state is not None and state["version"] == version:
+        return None
+
+    delta = None
+    current = os.path.join(directory, "current.pkl")
+    if state is not None and os.path.exists(current):
+        delta = diff(pd.read_pickle(current), df, key)
+        logging.info(f"{name} changes since {state['version'][:12]}: {delta.summary()}")
+
+    to_pickle_atomic(df, current)
+    write_state(name, {"version": version, "previous": state and state["version"]})
+    return delta
+
+
+def group_totals(df, by, sums):
+    """Row count and sums of df by group, an aggregate that can be added to"""
+    return df.groupby(by, dropna=False).agg(
+        rows=(by[0], "size"), **{col: (col, "sum") for col in sums}
+    )
+
+
+def incremental_totals(name, df, key, by, sums):
+    """
+    group_totals of df, updated from the previous call for name: the totals
+    of removed and previous rows are taken off and those of inserted and
+    updated rows added, so only the keys that changed are regrouped. Only
+    the key, by and sums columns are diffed and kept.
+    """
+    df = df[list(dict.fromkeys([key] + by + sums))]
+    path = os.path.join(state_dir(name), "totals.pkl")
+    if not os.path.exists(path):
+        totals = group_totals(df, by, sums)
+    else:
+        # the input and its totals are kept in one file so they stay in step
+        previous, totals = pd.read_pickle(path)
+        delta = diff(previous, df, key)
+        if len(delta) == 0:
+            return totals
+        logging.info(f"Updating {name} totals: {delta.summary()}")
+        old = pd.concat([delta.previous, delta.removed])
+        new = pd.concat([delta.inserted, delta.updated])
+        for rows, sign in [(old, -1), (new, 1)]:
+            if len(rows):
+                totals = totals.add(sign * group_totals(rows, by, sums), fill_value=0)
+        totals = totals[totals["rows"] > 0].astype({"rows": "int64"}).sort_index()
+    to_pickle_atomic((df, totals), path)
+    return totals
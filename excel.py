@@ -0,0 +1,60 @@
+"""
+Excel workbook sheets read with only the columns a getter uses.
+
+pd.read_excel through openpyxl is slow, so each source reading a workbook is
+read once per version of the file and cached like any other source, as an
+artifact keyed on the file hash or the url's ETag. main.py excel convert
+builds those sources up front, in parallel.
+"""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# every Workbook defined by a source, for converting them all up front
+WORKBOOKS = []
+
+
+class Workbook:
+    def __init__(self, io, sheet_name=0, usecols=None, *, module, **read_kwargs):
+        self.io = io
+        self.sheet_name = sheet_name
+        self.usecols = usecols
+        self.read_kwargs = read_kwargs
+        # the module defining the workbook (its __name__), whose sources read it
+        self.module = module
+        WORKBOOKS.append(self)
+
+    def __repr__(self):
+        return f"Workbook({self.io}, {self.sheet_name})"
+
+    def read(self):
+        logging.info(f"Reading {self}")
+        return pd.read_excel(
+            self.io,
+            sheet_name=self.sheet_name,
+            usecols=self.usecols,
+            **self.read_kwargs,
+        )
+
+
+def convert(name):
+    import registry
+
+    source = registry.resolve(name)
+    if not source.available:
+        logging.warning(f"{source.probe.path} not found, skipping")
+        return None
+    source.get_data()
+    return source.artifact_key
+
+
+def convert_all(sources, processes=None):
+    """
+    Build the artifacts of the sources (registry entries) defined alongside
+    a Workbook, in parallel. Returns source name -> artifact key.
+    """
+    modules = {workbook.module for workbook in WORKBOOKS}
+    names = [entry["name"] for entry in sources if entry["module"] in modules]
+    with ProcessPoolExecutor(processes) as pool:
+        return dict(zip(names, pool.map(convert, names)))
@@ -0,0 +1,148 @@
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import weakref
+
+import numpy as np
+import pandas as pd
+from diskcache import Cache
+
+from utils import CACHE_DIR
+
+SAMPLE_ROWS = 1024
+PROCESSER_CACHE_LIMIT = (
+    2 * 1024**3
+)  # bytes on disk before least recently used are evicted
+
+_MISSING = object()
+
+# id(frame) -> (weakref to frame, layout, fingerprint), so a frame is only
+# hashed once. The layout catches columns added in place by later processers.
+_KNOWN = {}
+
+
+def tag_version(df, version):
+    """Fingerprint a frame by a version id (e.g. source name and publish date)"""
+    _remember(df, f"version:{version}")
+
+
+def _layout(df):
+    columns = tuple(df.columns) if isinstance(df, pd.DataFrame) else (df.name,)
+    return (df.shape, columns)
+
+
+def _remember(df, fp):
+    key = id(df)
+    ref = weakref.ref(df, lambda _: _KNOWN.pop(key, None))
+    _KNOWN[key] = (ref, _layout(df), fp)
+
+
+def _known(df):
+    known = _KNOWN.get(id(df))
+    if known is not None and known[0]() is df and known[1] == _layout(df):
+        return known[2]
+    return None
+
+
+def _digest(*parts):
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def frame_fingerprint(df):
+    """
+    Shape, dtypes and a hash of an evenly spaced sample of rows.
+
+    Cheap compared to pickling the frame, but only sees changes in the sampled
+    rows; frames from a DataSource are keyed on their version instead.
+    """
+    fp = _known(df)
+    if fp is not None:
+        return fp
+
+    n = len(df)
+    rows = np.unique(np.linspace(0, n - 1, min(n, SAMPLE_ROWS)).astype(int))
+    sample = df.iloc[rows]
+    hashes = pd.util.hash_pandas_object(sample, index=True).to_numpy()
+    dtypes = sample.dtypes if isinstance(df, pd.DataFrame) else [sample.dtype]
+    columns = list(df.columns) if isinstance(df, pd.DataFrame) else [df.name]
+    fp = _digest(type(df).__name__, df.shape, columns, list(dtypes), hashes.tobytes())
+    _remember(df, fp)
+    return fp
+
+
+def fingerprint(obj):
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return frame_fingerprint(obj)
+    if isinstance(obj, np.ndarray):
+        return frame_fingerprint(pd.Series(obj.ravel()))
+    if isinstance(obj, dict):
+        return _digest("dict", *[f"{k!r}={fingerprint(v)}" for k, v in obj.items()])
+    if isinstance(obj, (list, tuple)):
+        return _digest(type(obj).__name__, *[fingerprint(v) for v in obj])
+    if obj is None or isinstance(obj, (str, int, float, bool, pd.Timestamp)):
+        return _digest(type(obj).__name__, repr(obj))
+    if hasattr(obj, "__dict__") and not callable(obj):
+        # objects holding frames or arrays, like a CharityRegister
+        return _digest(type(obj).__name__, fingerprint(vars(obj)))
+    return _digest("pickle", pickle.dumps(obj))
+
+
+class FingerprintCache:
+    """
+    Disk cache for processer results, keyed on argument fingerprints rather
+    than pickled arguments. Least recently used entries are evicted once the
+    cache is over size_limit bytes.
+    """
+
+    def __init__(self, directory, size_limit=PROCESSER_CACHE_LIMIT):
+        self.cache = Cache(
+            directory,
+            size_limit=size_limit,
+            eviction_policy="least-recently-used",
+        )
+        self.counts = {}
+
+    def memoize(self, name=None, version=""):
+        """version: bump to invalidate old results when the function changes"""
+
+        def decorator(func):
+            base = name or f"{func.__module__}.{func.__qualname__}"
+            counts = self.counts.setdefault(base, {"hits": 0, "misses": 0})
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = (base, version, fingerprint([args, kwargs]))
+                result = self.cache.get(key, default=_MISSING)
+                if result is not _MISSING:
+                    counts["hits"] += 1
+                    return result
+                counts["misses"] += 1
+                result = func(*args, **kwargs)
+                self.cache.set(key, result)
+                return result
+
+            return wrapper
+
+        return decorator
+
+    def stats(self):
+        return {
+            "functions": {key: dict(counts) for key, counts in self.counts.items()},
+            "entries": len(self.cache),
+            "bytes": self.cache.volume(),
+        }
+
+    def log_stats(self):
+        for key, counts in self.counts.items():
+            total = counts["hits"] + counts["misses"]
+            if total:
+                logging.info(f"Cache {key}: {counts['hits']}/{total} hits")
+
+
+PROCESSER_CACHE = FingerprintCache(os.path.join(CACHE_DIR, "processers"))
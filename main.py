@@ -1,17 +1,20 @@
-import importlib
 import logging
 import sys
 import traceback
 
-import assets
-import models
-from combine import DataBank
+import registry
+
+# models, runner and the sources are imported when needed, so listing sources
+# doesn't pay for pandas/plotly
 
 logging.basicConfig(level=logging.INFO)
 
 
 def run_asset(key):
-    asset = assets.ASSETS_DICT[key]
+    import models
+    from fingerprint import PROCESSER_CACHE
+
+    asset = registry.resolve(key)
 
     print("=" * 16)
     print(asset)
@@ -23,20 +26,124 @@ def run_asset(key):
     else:
         print("Success")
     print("=" * 16)
+    PROCESSER_CACHE.log_stats()
+
+
+def run_all_assets(processes=None):
+    from fingerprint import PROCESSER_CACHE
+    from runner import Runner
+
+    # shares intermediate frames between assets, releasing them when done
+    targets = [registry.resolve(name) for name in registry.asset_names()]
+    runner = Runner(targets, processes=processes)
+    runner.run(print_frame=True)
+    PROCESSER_CACHE.log_stats()
+
+
+def rebuild_changed():
+    from rebuild import rebuild_changed
+
+    rebuild_changed()
+
+
+def watch():
+    from watch import watch
+
+    watch()
+
+
+def convert_workbooks():
+    import excel
+
+    # importing the sources defines their Workbooks
+    sources = registry.source_entries()
+    for entry in sources:
+        registry.resolve(entry["name"])
+    for name, key in excel.convert_all(sources).items():
+        print(f"{name}: {key}")
 
 
-def run_all_assets():
-    for asset in assets.ASSETS_DICT:
-        run_asset(asset)
+def prune_artifacts():
+    from artifacts import ARTIFACTS
+
+    print(f"Removed {ARTIFACTS.prune()} unreferenced artifacts")
+
+
+def search_charities(args):
+    import search
+
+    filters = {"charity_registration_status": "Registered"}
+    words = []
+    refresh = False
+    args = iter(args)
+    for arg in args:
+        if arg == "--refresh":
+            refresh = True
+        elif arg == "--utla":
+            filters["utla_code"] = next(args)
+        elif arg == "--status":
+            filters["charity_registration_status"] = next(args)
+        else:
+            words.append(arg)
+    if refresh or not search.has_index():
+        install_search_index(refresh)
+    # memory-mapped, so a query reads only the postings of its terms
+    for id, name in search.search(" ".join(words), filters):
+        print(f"{id}\t{name}")
+
+
+def install_search_index(refresh):
+    """
+    Save the published charity search index to SEARCH_DIR: the latest one,
+    however old, or with refresh one brought up to date, rebuilding the
+    charity assets if their sources have moved on
+    """
+    import search
+    from artifacts import ARTIFACTS
+
+    asset = registry.resolve("Charity search index").inputs["index"]
+    index = None
+    if not refresh:
+        forever = float("inf")
+        index = ARTIFACTS.fetch(asset.artifact_key(max_age=forever), max_age=forever)
+    if index is None:
+        index = asset.get_data()
+    search.install_index(index)
+
+
+def generate_hexes(geography):
+    from plotting import hex_layout
+
+    df = hex_layout.write_hexes(geography)
+    print(f"{len(df)} {geography} hexes")
 
 
 def all_sources():
-    for source in assets.all_sources():
-        print(source)
+    for source in registry.source_entries():
+        print(f"DataSource({source['name']}, {source['source_type']})")
 
 
 def sources_up_to_date():
-    for source in assets.all_sources():
+    # answered from the catalog of loaded versions, without loading any data
+    import catalog
+    import models
+
+    versions = catalog.latest_versions()
+    for entry in registry.source_entries():
+        version = versions.get(entry["name"])
+        if version is None:
+            print(
+                f"{entry['name']} (not in catalog): run `main.py source date refresh`"
+            )
+        else:
+            print(
+                models.date_info(entry["name"], models.DateMeta.from_catalog(version))
+            )
+
+
+def refresh_sources():
+    for entry in registry.source_entries():
+        source = registry.resolve(entry["name"])
         source.get_data()
         print(source.date_info)
 
@@ -50,8 +157,33 @@ if __name__ == "__main__":
             all_sources()
         case [main, "source", "date"]:
             sources_up_to_date()
+        case [main, "source", "date", "refresh"]:
+            # load every source, recording its version in the catalog
+            refresh_sources()
         case [main, "asset", "all"]:
             run_all_assets()
+        case [main, "asset", "all", "-j", processes]:
+            # run cpu_bound assets in a pool of worker processes
+            run_all_assets(int(processes))
+        case [main, "rebuild", "--changed"]:
+            # rebuild only the assets downstream of sources with a new version
+            rebuild_changed()
+        case [main, "watch"]:
+            # rebuild assets when partner files in data/ or resources/ change
+            watch()
+        case [main, "excel", "convert"]:
+            # build the artifact of every source read from a workbook, in parallel
+            convert_workbooks()
+        case [main, "search", *args]:
+            # e.g. main.py search food bank --utla E06000001 --status Removed,
+            # from the index published for the "Charity search index" asset;
+            # --refresh brings the local copy up to date first
+            search_charities(args)
+        case [main, "hexes", geography]:
+            # regenerate a geography's hex layout from the LAD centroids
+            generate_hexes(geography)
+        case [main, "artifacts", "prune"]:
+            prune_artifacts()
         case [main, "asset", *names]:
             print(names)
             for name in names:
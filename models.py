@@ -1,13 +1,21 @@
+import hashlib
 import logging
 import os
-from dataclasses import dataclass
+import threading
+import time
+from dataclasses import dataclass, field
 from enum import Enum
 
 import pandas as pd
-import plotly
 import slugify
 
-from utils import OUTPUT_DIR
+import catalog
+import changes
+import registry
+import snapshots
+from artifacts import ARTIFACTS
+from fingerprint import tag_version
+from utils import OUTPUT_DIR, FileProbe, UrlProbe
 
 DATE_FMT = "%d %b %Y"
 
@@ -44,6 +52,13 @@ class DateMeta:
         self.date_keys = ["update_freq", "latest_date", "publish_date", "expected_lag"]
         self.update_str = ""
 
+    def refresh(self, dateUpdate):
+        """Take the dates of a newer version of the data"""
+        for key in self.date_keys:
+            new = getattr(dateUpdate, key)
+            if new:
+                setattr(self, key, new)
+
     def update(self, dateUpdate):
         for key in self.date_keys:
             old = getattr(self, key)
@@ -100,11 +115,58 @@ class DateMeta:
         dates = {key: getattr(self, key) for key in self.date_keys}
         return f"DateMeta({dates})"
 
+    @classmethod
+    def from_catalog(cls, version):
+        def timestamp(key):
+            return pd.Timestamp(version[key]) if version[key] else None
+
+        def delta(key):
+            return pd.Timedelta(days=version[key]) if version[key] else None
+
+        return cls(
+            update_freq=delta("update_freq_days"),
+            latest_date=timestamp("latest_date"),
+            publish_date=timestamp("publish_date"),
+            expected_lag=delta("expected_lag_days"),
+        )
+
+
+def date_info(name, dateMeta):
+    valid = dateMeta.validate(name)
+
+    if valid is True:
+        message = "up to date"
+    elif valid is False:
+        message = "due update"
+    elif valid is None:
+        message = "no update info"
+    else:
+        raise RuntimeError
+
+    output = f"{name} ({message}): "
+    if dateMeta.latest_date:
+        output += f"latest data from: {dateMeta.latest_date.strftime(DATE_FMT)}; "
+    if dateMeta.publish_date:
+        output += f"published on: {dateMeta.publish_date.strftime(DATE_FMT)}."
+    if dateMeta.publish_date and dateMeta.update_freq:
+        update_due = dateMeta.publish_date + dateMeta.update_freq
+        output += f" Next update expected: {update_due.strftime(DATE_FMT)}."
+    return output
+
 
 @dataclass
 class DataDate:
     df: pd.DataFrame
     dateMeta: DateMeta
+    fetch_seconds: float | None = None
+    probe: str | None = None
+
+    def __getstate__(self):
+        # left out of the artifact, so rebuilding the same content publishes
+        # the same digest
+        state = self.__dict__.copy()
+        state["fetch_seconds"] = None
+        return state
 
 
 @dataclass
@@ -117,44 +179,173 @@ class DataSource:
     sub_org: str = ""
     instructions: str = ""
     description: str = ""
-    dateMeta: DateMeta = DateMeta()
+    dateMeta: DateMeta = field(default_factory=DateMeta)
     data: pd.DataFrame | None = None
+    spill_path: str | None = None
+    # serve a cached version up to stale_window old (default update_freq)
+    # straight away, refreshing it in the background
+    stale_while_revalidate: bool = False
+    stale_window: pd.Timedelta | None = None
+    # cheap check returning a token that changes when the source does,
+    # e.g. a file hash or a url's ETag
+    probe: callable = None
+    # column identifying rows across versions; when set each new version is
+    # diffed against the previous one, see changes.capture
+    change_key: str | None = None
+    # changes whenever data_getter's output does for the same upstream data,
+    # e.g. when it keeps more columns, so published versions aren't reused
+    version: str = ""
+    # a local file the assets can do without: while it is missing get_data
+    # returns None rather than raising
+    optional: bool = False
+    # a version refreshed in the background, swapped in by apply_refresh
+    refreshed_data: DataDate | None = field(default=None, repr=False)
+    refresh_lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
 
     def get_data(self):
         if self.data is not None:
             return self.data
+        if self.spill_path is not None:
+            # released by the runner, reload the spilled frame
+            self.data = pd.read_pickle(self.spill_path)
+            return self.data
 
-        dataDate = self.data_getter()
-        assert (
-            type(dataDate) is DataDate
-        ), f"DataSource({self.name}).data_getter must return a DataDate object"
+        if not self.available:
+            if self.optional:
+                logging.warning(f"{self.probe.path} not found, skipping {self.name}")
+                return None
+            raise FileNotFoundError(f"{self.probe.path} not found for {self.name}")
+        # built once and shared through the artifact store; concurrent runs
+        # wait for one fetch rather than each downloading
+        dataDate = ARTIFACTS.get_or_build(
+            self.artifact_key,
+            self.build,
+            max_age=self.max_age,
+            stale_window=self.stale_seconds,
+            on_refresh=self.refreshed,
+        )
 
         self.dateMeta.update(dataDate.dateMeta)
         self.dateMeta.validate(self.name)
-        self.data = dataDate.df
+        self.set_data(dataDate.df)
+        self.record(dataDate)
         return self.data
 
-    @property
-    def date_info(self):
-        valid = self.dateMeta.validate(self.name)
-
-        if valid is True:
-            message = "up to date"
-        elif valid is False:
-            message = "due update"
-        elif valid is None:
-            message = "no update info"
-        else:
-            raise RuntimeError
+    def reload(self):
+        """Build a new version now, ignoring any cached artifact"""
+        self.data, self.spill_path = None, None
+        if not self.available:
+            raise FileNotFoundError(f"{self.probe.path} not found for {self.name}")
+        dataDate = ARTIFACTS.build(self.artifact_key, self.build, max_age=0)
+        self.dateMeta.refresh(dataDate.dateMeta)
+        self.dateMeta.validate(self.name)
+        self.set_data(dataDate.df)
+        self.record(dataDate)
+        return self.data
 
-        output = f"{self.name} ({message}): "
-        if self.dateMeta.latest_date:
-            output += (
-                f"latest data from: {self.dateMeta.latest_date.strftime(DATE_FMT)}; "
+    def build(self):
+        start = time.perf_counter()
+        probe = self.probe() if self.probe else None
+        dataDate = self.data_getter()
+        assert (
+            type(dataDate) is DataDate
+        ), f"DataSource({self.name}).data_getter must return a DataDate object"
+        dataDate.fetch_seconds = time.perf_counter() - start
+        dataDate.probe = probe
+        return dataDate
+
+    def record(self, dataDate):
+        ref = ARTIFACTS.ref(self.artifact_key, max_age=float("inf"))
+        if ref is None:
+            return
+        catalog.record(
+            self.name,
+            dataDate.df,
+            self.dateMeta,
+            content_hash=ref["digest"],
+            byte_size=ref["size"],
+            fetch_seconds=dataDate.fetch_seconds,
+            probe=dataDate.probe,
+        )
+        if self.change_key:
+            delta = changes.capture(
+                self.name, dataDate.df, self.change_key, ref["digest"]
             )
+            snapshots.record(
+                self.name,
+                dataDate.df,
+                self.change_key,
+                self.dateMeta.publish_date,
+                ref["digest"],
+                delta,
+            )
+
+    def set_data(self, df):
         if self.dateMeta.publish_date:
-            output += f"published on: {self.dateMeta.publish_date.strftime(DATE_FMT)}."
-        return output
+            tag_version(df, f"{self.name}@{self.dateMeta.publish_date}")
+        self.data = df
+
+    def refreshed(self, dataDate):
+        # called from the refresh thread, so only hand the new version over
+        with self.refresh_lock:
+            self.refreshed_data = dataDate
+
+    def apply_refresh(self):
+        """
+        Swap in a version refreshed in the background. Called between runs,
+        so processers never see the data change under them.
+        """
+        with self.refresh_lock:
+            dataDate, self.refreshed_data = self.refreshed_data, None
+        if dataDate is not None and self.data is not None:
+            self.dateMeta.refresh(dataDate.dateMeta)
+            self.set_data(dataDate.df)
+            self.record(dataDate)
+
+    @property
+    def stale_seconds(self):
+        if not self.stale_while_revalidate:
+            return None
+        window = self.stale_window or self.dateMeta.update_freq
+        return window.total_seconds() if window else None
+
+    @property
+    def available(self):
+        """False for a source read from a local file that is missing"""
+        return not isinstance(self.probe, FileProbe) or self.probe() is not None
+
+    @property
+    def versioned(self):
+        """Whether artifact_key changes with each version of the source"""
+        return isinstance(self.probe, (FileProbe, UrlProbe))
+
+    @property
+    def max_age(self):
+        # a versioned key names one version, which never goes stale
+        return float("inf") if self.versioned else None
+
+    @property
+    def artifact_key(self):
+        """None for an unavailable source, which has no artifact"""
+        key = slugify.slugify(self.name)
+        if self.version:
+            key += f"-{hashlib.sha256(self.version.encode()).hexdigest()[:8]}"
+        if isinstance(self.probe, FileProbe):
+            # local files are cheap to hash, so a changed file is a new key
+            token = self.probe()
+            if token is None:
+                return None
+            key += f"-{token[:16]}"
+        elif isinstance(self.probe, UrlProbe):
+            # a new ETag or Last-Modified is a new key
+            key += f"-{hashlib.sha256(self.probe().encode()).hexdigest()[:16]}"
+        return key
+
+    @property
+    def date_info(self):
+        return date_info(self.name, self.dateMeta)
 
     def __repr__(self):
         return f"DataSource({self.name}, {self.source_type.name})"
@@ -167,18 +358,44 @@ class DataAsset:
         description: str = "",
         inputs: dict = {},
         processer=None,
+        cpu_bound: bool = False,
     ):
         self.name = name
         self.description = description
         self.inputs = inputs
         self.sources = self.collect_sources(inputs)
         self.processer = processer
+        # run in a worker process when the Runner has a process pool
+        self.cpu_bound = cpu_bound
 
     def get_data(self):
+        output = ARTIFACTS.fetch(self.artifact_key())
+        if output is not None:
+            return output
         data = {key: i.get_data() for key, i in self.inputs.items()}
         data = self.processer(data)
+        ARTIFACTS.publish(self.artifact_key(), data)
         return data
 
+    def artifact_key(self, max_age=None):
+        """
+        Key for this asset's result given the published versions of its
+        sources, or None if any of them has no artifact within max_age
+        (default the store's)
+        """
+        refs = [
+            ARTIFACTS.ref(source.artifact_key, max_age or source.max_age)
+            for source in self.sources
+            # a missing optional source is left out, so the key changes when
+            # its file turns up
+            if source.available or not source.optional
+        ]
+        if not all(refs):
+            return None
+        versions = [registry.code_hash()] + [ref["digest"] for ref in refs]
+        version = hashlib.sha256("".join(versions).encode()).hexdigest()[:16]
+        return f"{slugify.slugify(self.name)}-{version}"
+
     def collect_sources(self, inputs):
         sources = []
         stack = list(inputs.values())
@@ -208,9 +425,13 @@ class Report:
     assets: tuple
     sources = set()
 
-    def get_data(self):
+    def get_data(self, outputs=None):
+        # outputs: asset name -> already computed asset data, e.g. from a Runner
+        outputs = outputs or {}
         title = f"# {self.name}"
-        content = [Output(asset).to_md_str() for asset in self.assets]
+        content = [
+            Output(asset).to_md_str(outputs.get(asset.name)) for asset in self.assets
+        ]
         return "\n\n".join([title] + content)
 
 
@@ -221,8 +442,8 @@ class Output:
     def __repr__(self):
         return f"Output({self.asset.name})"
 
-    def to_md_str(self):
-        path = self.to_file()
+    def to_md_str(self, output=None):
+        path = self.to_file(output=output)
         # point to output file as report will be there too
         # TODO group files needed for report into a dir
         splitpath = os.path.normpath(path).split(os.sep)
@@ -243,8 +464,11 @@ class Output:
         ]
         return "\n\n".join(lines)
 
-    def to_file(self, print_frame=False):
-        output = self.asset.get_data()
+    def to_file(self, print_frame=False, output=None):
+        import plotly.graph_objects
+
+        if output is None:
+            output = self.asset.get_data()
         fname = slugify.slugify(self.asset.name)
         if isinstance(output, pd.DataFrame):
             if print_frame:
@@ -0,0 +1,161 @@
+"""
+Choropleth maps drawn from the boundary files, next to the hex maps.
+
+Full resolution BFC boundaries make plotly output huge, so each level's
+boundaries are simplified once per zoom with shapely.coverage_simplify, which
+keeps shared borders shared, then rounded to a few decimal places and cached
+as GeoJSON. Only the region and country boundaries are in resources/; the
+LTLA and UTLA files are large and have to be downloaded first.
+"""
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import shapely
+
+import spatial
+import utils
+from plotting.hex import GEOGRAPHY
+from plotting.style import CONTRAST, NULL_GREY, npc_style
+
+CHOROPLETH_DIR = os.path.join(utils.CACHE_DIR, "choropleth")
+
+# zoom -> (simplification tolerance, coordinate decimal places), in degrees
+ZOOMS = {
+    "national": (0.01, 3),
+    "regional": (0.002, 4),
+    "local": (0.0005, 4),
+}
+
+
+def simplified_geojson(geography, zoom="national"):
+    """The level's boundaries simplified for zoom, with features keyed by code"""
+    tolerance, decimals = ZOOMS[zoom]
+    token = spatial.boundary_token(geography)
+    path = os.path.join(CHOROPLETH_DIR, f"{geography}-{zoom}-{token[:16]}.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+
+    logging.info(f"Simplifying {geography} boundaries for {zoom} zoom")
+    boundaries = spatial.boundaries(geography)
+    geometries = shapely.coverage_simplify(boundaries.geometries, tolerance)
+    # shared vertices round the same way, so borders stay shared
+    geometries = shapely.transform(geometries, lambda c: np.round(c, decimals))
+    geometries = shapely.remove_repeated_points(geometries)
+    geojson = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {"code": code, "name": name},
+                "geometry": json.loads(shapely.to_geojson(geometry)),
+            }
+            for code, name, geometry in zip(
+                boundaries.codes.tolist(), boundaries.names.tolist(), geometries
+            )
+        ],
+    }
+    with utils.atomic_write(path, "w") as f:
+        json.dump(geojson, f, separators=(",", ":"))
+    return geojson
+
+
+def plot_choropleth(
+    df,
+    geography,
+    plot_col,
+    palette="magma_r",
+    zmax=None,
+    highlight=None,
+    title="",
+    zoom="national",
+):
+    import plotly.graph_objects as go
+    import seaborn as sns
+
+    G = GEOGRAPHY[geography]
+    geojson = simplified_geojson(geography, zoom)
+    codes = pd.DataFrame(
+        {G.code_col: [f["properties"]["code"] for f in geojson["features"]]}
+    )
+    df = pd.merge(codes, df, how="left", on=G.code_col)
+
+    df["display_color"] = df[plot_col]
+    if zmax:
+        df["display_color"] = df["display_color"].clip(upper=zmax)
+
+    df_valid = df.loc[df[plot_col].notnull()]
+    df_null = df.loc[df[plot_col].isnull()]
+
+    common = dict(
+        geojson=geojson,
+        featureidkey="properties.code",
+        marker_line_width=0.3,
+        marker_line_color="white",
+        name="",
+    )
+    fig = go.Figure()
+    fig.add_trace(
+        go.Choropleth(
+            locations=df_valid[G.code_col],
+            z=df_valid["display_color"],
+            colorscale=sns.color_palette(palette).as_hex(),
+            colorbar=dict(
+                title=title,
+                thicknessmode="fraction",
+                thickness=0.03,
+                lenmode="fraction",
+                len=0.4,
+                yanchor="bottom",
+                y=0,
+                x=0,
+                tick0=0,
+                tickformat=",.0r",
+            ),
+            text=df_valid.get(G.name_col, df_valid[G.code_col]),
+            customdata=df_valid[plot_col].round(0),
+            hovertemplate="%{text}: %{customdata}",
+            **common,
+        )
+    )
+    fig.add_trace(
+        go.Choropleth(
+            locations=df_null[G.code_col],
+            z=np.zeros(len(df_null)),
+            colorscale=[NULL_GREY, NULL_GREY],
+            showscale=False,
+            hoverinfo="skip",
+            **common,
+        )
+    )
+
+    if highlight is not None:
+        dfh = df[df[G.code_col].isin(highlight.values)]
+        fig.add_trace(
+            go.Choropleth(
+                locations=dfh[G.code_col],
+                z=np.zeros(len(dfh)),
+                colorscale=["rgba(0,0,0,0)", "rgba(0,0,0,0)"],
+                showscale=False,
+                hoverinfo="skip",
+                geojson=geojson,
+                featureidkey="properties.code",
+                marker_line_width=1.5,
+                marker_line_color=CONTRAST,
+            )
+        )
+
+    fig.update_geos(fitbounds="locations", visible=False)
+    npc_style(fig)
+    fig.update_layout(
+        showlegend=False,
+        autosize=False,
+        width=350,
+        height=350,
+        margin=dict(b=0, t=0, r=0, l=0),
+    )
+
+    return fig
@@ -5,8 +5,6 @@ from dataclasses import dataclass
 
 import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
-import seaborn as sns
 
 import utils
 from plotting.style import CONTRAST, NULL_GREY, npc_style
@@ -43,12 +41,17 @@ GEOGRAPHY = {
         {"CTYUA22CD": "utla_code"},
     ),
     "region": Geographylevel(
-        "region_name", "region_code", None, 1, "Regions_(December_2022)_EN_BFC.json", {}
+        "region_name",
+        "region_code",
+        "region_hex.csv",
+        1,
+        "Regions_(December_2022)_EN_BFC.json",
+        {},
     ),
     "country": Geographylevel(
         "country_name",
         "country_code",
-        None,
+        "country_hex.csv",
         1,
         "Countries_(December_2022)_GB_BFC.json",
         {},
@@ -65,6 +68,9 @@ def get_hexes(geography_level):
 def plot_hexes(
     df, geography, plot_col, palette="magma_r", zmax=None, highlight=None, title=""
 ):
+    import plotly.graph_objects as go
+    import seaborn as sns
+
     G = GEOGRAPHY[geography]
     hexes = get_hexes(G)
     df = pd.merge(hexes, df, how="left", on=G.code_col)
@@ -0,0 +1,148 @@
+"""
+Hex cartogram layouts generated from area centroids.
+
+Each area is given a cell of a hex grid, laid out like ltla_hex.csv with odd
+rows shifted half a cell left, by solving one linear assignment of areas to
+cells that minimises the total squared distance from centroid to cell. Areas
+that are close on the map end up in nearby cells, and the grid keeps the
+overall shape of the country.
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+
+import utils
+from plotting.hex import GEOGRAPHY
+
+CENTROID_FILE = "Local_Authority_Districts_December_2022_Boundaries_UK_BFC.csv"
+ROW_HEIGHT = np.sqrt(3) / 2
+METRES_PER_DEGREE = 111_320
+# empty cells around the centroids the assignment can spread areas into
+MARGIN = 3
+
+
+def lad_centroids():
+    df = pd.read_csv(
+        os.path.join(utils.RESOURCE_DIR, CENTROID_FILE), encoding="utf-8-sig"
+    )
+    return df.rename(
+        columns={
+            "LAD22CD": "la_code",
+            "LAD22NM": "la_name",
+            "SHAPE_Area": "area",
+        }
+    )[["la_code", "la_name", "LONG", "LAT", "area"]]
+
+
+def get_lookup(geography):
+    from sources.public import geoportal
+
+    getter = {
+        "UTLA": geoportal.get_ltla_utla_lookup,
+        "region": geoportal.get_ltla_region_lookup,
+        "country": geoportal.get_ltla_country_lookup,
+    }[geography]
+    return getter().df
+
+
+def centroids(geography):
+    """
+    Code, name, LONG, LAT and area (m2) of each area of geography. Areas above
+    LTLA are centred on the area weighted mean of their LTLA centroids.
+    """
+    G = GEOGRAPHY[geography]
+    df = lad_centroids()
+    if geography != "LTLA":
+        lookup = get_lookup(geography)[["la_code", G.code_col, G.name_col]]
+        df = pd.merge(df, lookup, on="la_code", how="left")
+        # as in combine_lkps, LAs missing from the UTLA lookup are their own
+        # UTLA, and those missing a region fall back to their country
+        if geography == "UTLA":
+            fallback = df[["la_code", "la_name"]]
+        else:
+            fallback = pd.merge(df[["la_code"]], get_lookup("country"), how="left")
+            fallback = fallback[["country_code", "country_name"]]
+        cols = [G.code_col, G.name_col]
+        df[cols] = df[cols].fillna(fallback.set_axis(cols, axis=1))
+        for col in ["LONG", "LAT"]:
+            df[col] = df[col] * df["area"]
+        df = df.groupby([G.code_col, G.name_col], as_index=False)[
+            ["LONG", "LAT", "area"]
+        ].sum()
+        for col in ["LONG", "LAT"]:
+            df[col] = df[col] / df["area"]
+    return df.rename(columns={"la_code": G.code_col, "la_name": G.name_col})
+
+
+def hex_cells(x, y, spacing):
+    """Cell indexes and centres of a hex grid covering points x, y"""
+    xi, yi = np.meshgrid(
+        np.arange(np.floor(x.min() / spacing) - MARGIN, x.max() / spacing + MARGIN),
+        np.arange(
+            2 * np.floor(y.min() / (2 * spacing * ROW_HEIGHT)) - MARGIN,
+            y.max() / (spacing * ROW_HEIGHT) + MARGIN,
+        ),
+    )
+    xi, yi = xi.ravel(), yi.ravel()
+    return xi, yi, spacing * (xi - 0.5 * (yi % 2)), spacing * ROW_HEIGHT * yi
+
+
+def hex_layout(lon, lat, area):
+    """
+    xi, yi grid cell and grid_x, grid_y position of each centroid, in
+    degrees of latitude, with one cell for each area's share of the land
+    """
+    lon, lat, area = (np.asarray(a, dtype=float) for a in [lon, lat, area])
+    # a local equirectangular projection, so distances are about even
+    x = lon * np.cos(np.radians(lat.mean()))
+    spacing = np.sqrt(area.sum() / len(area) / ROW_HEIGHT) / METRES_PER_DEGREE
+    xi, yi, cell_x, cell_y = hex_cells(x, lat, spacing)
+
+    cost = (x[:, None] - cell_x[None, :]) ** 2 + (lat[:, None] - cell_y[None, :]) ** 2
+    rows, cells = linear_sum_assignment(cost)
+    cells = cells[np.argsort(rows)]
+
+    # shift to start at 0, by an even number of rows to keep the row offsets
+    xi, yi = xi[cells], yi[cells]
+    xi = xi - xi.min()
+    yi = yi - 2 * np.floor(yi.min() / 2)
+    return pd.DataFrame(
+        {
+            "grid_x": cell_x[cells],
+            "grid_y": cell_y[cells],
+            "xi": xi,
+            "yi": yi,
+        }
+    )
+
+
+def hex_file_columns(geography):
+    """Code and name columns as they are named in the hex file"""
+    G = GEOGRAPHY[geography]
+    code_col = {v: k for k, v in G.rename_col_map.items()}.get(G.code_col, G.code_col)
+    name_col = code_col[:-2] + "NM" if code_col.endswith("CD") else G.name_col
+    return code_col, name_col
+
+
+def write_hexes(geography, path=None):
+    """Generate geography's hex layout in the format get_hexes reads"""
+    G = GEOGRAPHY[geography]
+    path = path or os.path.join(utils.RESOURCE_DIR, G.hex_file)
+    df = centroids(geography)
+    layout = hex_layout(df["LONG"], df["LAT"], df["area"])
+    code_col, name_col = hex_file_columns(geography)
+    df = pd.concat(
+        [
+            df[[G.code_col, G.name_col, "LONG", "LAT"]].rename(
+                columns={G.code_col: code_col, G.name_col: name_col}
+            ),
+            layout,
+        ],
+        axis=1,
+    )
+    logging.info(f"Writing {len(df)} {geography} hexes to {path}")
+    df.to_csv(path)
+    return df
@@ -0,0 +1,69 @@
+import logging
+
+import catalog
+import registry
+from runner import Runner
+
+
+def source_changed(source, previous):
+    """
+    Whether a source has a new version since the one last catalogued. Sources
+    with a probe are checked with it; others are reloaded and compared by
+    content hash. A source never catalogued counts as changed without being
+    fetched here; the rebuild loads it.
+    """
+    if previous is None:
+        return True
+    if source.probe is not None:
+        if source.probe() == previous["probe"]:
+            return False
+        source.reload()
+        return True
+    source.reload()
+    return (
+        catalog.latest_versions()[source.name]["content_hash"]
+        != previous["content_hash"]
+    )
+
+
+def changed_sources():
+    versions = catalog.latest_versions()
+    changed = []
+    for entry in registry.source_entries():
+        source = registry.resolve(entry["name"])
+        if not source.available:
+            logging.info(f"{source.name} is unavailable, not checking it")
+            continue
+        try:
+            if source_changed(source, versions.get(source.name)):
+                changed.append(source.name)
+        except Exception:
+            logging.exception(f"Unable to check {source.name} for changes")
+    return changed
+
+
+def affected_assets(source_names):
+    """Names of assets depending on any of source_names, in ASSETS order"""
+    index = registry.reverse_index()
+    affected = set()
+    for name in source_names:
+        affected.update(index.get(name, []))
+    return [name for name in registry.asset_names() if name in affected]
+
+
+def rebuild(source_names, processes=None, release_sources=True):
+    names = affected_assets(source_names)
+    for name in source_names:
+        print(f"Changed: {name}")
+    if not names:
+        print("Nothing to rebuild")
+        return
+    targets = [registry.resolve(name) for name in names]
+    # the runner builds each target's inputs before it, so targets run in
+    # dependency order
+    runner = Runner(targets, processes=processes, release_sources=release_sources)
+    runner.run(print_frame=True)
+
+
+def rebuild_changed(processes=None):
+    rebuild(changed_sources(), processes)
@@ -0,0 +1,148 @@
+"""
+Asset names and dependency metadata, readable without importing any source.
+
+Importing assets.py pulls in every source module and through them pandas,
+plotly, seaborn and requests. The registry keeps a manifest of what assets.py
+defines so the CLI can list names and find an asset's module, importing
+that module only when the asset is built. The manifest is regenerated from
+assets.py whenever the code changes. It is generated into the cache
+directory, never into the source tree.
+"""
+import functools
+import glob
+import hashlib
+import importlib
+import json
+import os
+import sys
+
+# utils.CACHE_DIR, not imported to keep pandas out of CLI startup
+MANIFEST = os.path.join("cachedir", "asset_registry.json")
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# every module a processer can reach, so editing any of them invalidates
+# the artifacts built with the old code
+ASSET_MODULES = [
+    "*.py",
+    os.path.join("plotting", "**", "*.py"),
+    os.path.join("sources", "**", "*.py"),
+]
+
+
+@functools.lru_cache
+def code_hash():
+    h = hashlib.sha256()
+    for pattern in ASSET_MODULES:
+        for path in sorted(glob.glob(pattern, root_dir=ROOT, recursive=True)):
+            with open(os.path.join(ROOT, path), "rb") as f:
+                h.update(path.encode() + f.read())
+    return h.hexdigest()
+
+
+def find_attr(obj, module_names):
+    for module_name in module_names:
+        module = sys.modules.get(module_name)
+        for attr, value in vars(module).items():
+            if value is obj:
+                return module_name, attr
+    raise RuntimeError(f"{obj} is not defined at module level")
+
+
+def entry(obj, kind):
+    # prefer the module that defines the getter/processer over ones that import obj
+    func = getattr(obj, "data_getter", None) or getattr(obj, "processer", None)
+    home = getattr(func, "__module__", None)
+    candidates = [home] if home in sys.modules else []
+    candidates += sorted(
+        name
+        for name in sys.modules
+        if name in ("assets", "combine") or name.startswith("sources.")
+    )
+    module, attr = find_attr(obj, candidates)
+
+    item = {"name": obj.name, "kind": kind, "module": module, "attr": attr}
+    if kind == "DataSource":
+        item["source_type"] = obj.source_type.name
+    elif kind == "DataAsset":
+        item["inputs"] = [i.name for i in obj.inputs.values()]
+        item["sources"] = [s.name for s in obj.sources]
+    else:
+        item["inputs"] = [a.name for a in obj.assets]
+    return item
+
+
+def build_manifest():
+    import assets
+    import combine  # noqa: F401, so DataBank's module is known
+
+    manifest = {
+        "code_hash": code_hash(),
+        "assets": [entry(a, type(a).__name__) for a in assets.ASSETS],
+        "sources": [entry(s, "DataSource") for s in assets.all_sources()],
+    }
+    try:
+        os.makedirs(os.path.dirname(MANIFEST), exist_ok=True)
+        with open(MANIFEST, "w") as f:
+            json.dump(manifest, f, indent=1)
+    except OSError:
+        pass
+    return manifest
+
+
+_MANIFEST = None
+
+
+def manifest():
+    global _MANIFEST
+    if _MANIFEST is None:
+        try:
+            with open(MANIFEST) as f:
+                _MANIFEST = json.load(f)
+        except (OSError, ValueError):
+            _MANIFEST = {}
+        if _MANIFEST.get("code_hash") != code_hash():
+            _MANIFEST = build_manifest()
+    return _MANIFEST
+
+
+def asset_names():
+    return [item["name"] for item in manifest()["assets"]]
+
+
+def source_entries():
+    return manifest()["sources"]
+
+
+def reverse_index():
+    """
+    Source name -> names of the assets and reports that depend on it, in
+    ASSETS order. Reports depend on the sources of the assets they include.
+    """
+    index = {source["name"]: [] for source in source_entries()}
+    asset_sources = {}
+    for item in manifest()["assets"]:
+        if item["kind"] == "DataSource":
+            sources = {item["name"]}
+        elif item["kind"] == "DataAsset":
+            sources = set(item["sources"])
+        else:
+            sources = set().union(
+                *[asset_sources.get(i, set()) for i in item["inputs"]]
+            )
+        asset_sources[item["name"]] = sources
+        for source in sources:
+            index.setdefault(source, []).append(item["name"])
+    return index
+
+
+def find(name):
+    for item in manifest()["assets"] + manifest()["sources"]:
+        if item["name"] == name:
+            return item
+    raise KeyError(name)
+
+
+def resolve(name):
+    """Import the module defining the named asset or source and return it"""
+    item = find(name)
+    module = importlib.import_module(item["module"])
+    return getattr(module, item["attr"])
@@ -0,0 +1,268 @@
+import logging
+import os
+import shutil
+import tempfile
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import slugify
+
+import models
+from artifacts import ARTIFACTS
+from shared_frames import SharedFrame
+from utils import MEMORY_BUDGET, SPILL_DIR
+
+
+def node_inputs(node):
+    if isinstance(node, models.DataAsset):
+        return node.inputs
+    if isinstance(node, models.Report):
+        return {asset.name: asset for asset in node.assets}
+    return {}
+
+
+def run_processer(processer, data):
+    data = {
+        key: value.to_frame() if isinstance(value, SharedFrame) else value
+        for key, value in data.items()
+    }
+    return processer(data)
+
+
+def frame_bytes(output):
+    if isinstance(output, (pd.DataFrame, pd.Series)):
+        return int(output.memory_usage(deep=True).sum())
+    return 0
+
+
+class Runner:
+    """
+    Builds a set of target nodes, sharing intermediate frames between them.
+
+    Each node's frame is kept only while it has pending consumers. Once the
+    last consumer has run the frame is released; DataSource frames are spilled
+    to disk so any later get_data() call reloads them instead of refetching.
+    If the frames held go over memory_budget (bytes) the largest idle ones
+    are spilled early and read back when next needed.
+
+    With release_sources=False, DataSource frames stay loaded after the run,
+    for long lived processes such as watch mode.
+
+    With processes set, cpu_bound DataAssets run in a process pool as soon as
+    their inputs are ready, so independent heavy branches run side by side.
+    Input frames reach the workers through shared memory, not pickling.
+    """
+
+    def __init__(
+        self,
+        targets,
+        memory_budget=MEMORY_BUDGET,
+        processes=None,
+        release_sources=True,
+    ):
+        self.targets = list(targets)
+        self.memory_budget = memory_budget
+        self.processes = processes
+        self.release_sources = release_sources
+        self.nodes = {}
+        self.pending = {}
+        for target in self.targets:
+            self.add_node(target)
+            self.pending[target.name] += 1  # writing the output
+
+        self.frames = {}
+        self.sizes = {}
+        self.spilled = {}
+        self.attempted = set()
+        self.spill_dir = None
+        self.pool = None
+        self.futures = {}
+        self.shared = {}
+
+    def add_node(self, node):
+        if node.name in self.nodes:
+            return
+        self.nodes[node.name] = node
+        self.pending[node.name] = 0
+        for input_ in node_inputs(node).values():
+            self.add_node(input_)
+            self.pending[input_.name] += 1
+
+    def run(self, print_frame=False):
+        os.makedirs(SPILL_DIR, exist_ok=True)
+        self.spill_dir = tempfile.mkdtemp(dir=SPILL_DIR)
+        for node in self.nodes.values():
+            if isinstance(node, models.DataSource):
+                node.apply_refresh()
+        if self.processes:
+            self.pool = ProcessPoolExecutor(self.processes)
+        try:
+            for target in self.targets:
+                print("=" * 16)
+                print(target)
+                try:
+                    output = self.get(target)
+                    models.Output(target).to_file(print_frame, output=output)
+                except Exception:
+                    print(traceback.format_exc())
+                    print("Falure")
+                else:
+                    print("Success")
+                finally:
+                    self.consumed(target)
+                print("=" * 16)
+        finally:
+            self.cleanup()
+
+    def get(self, node):
+        name = node.name
+        if name in self.frames:
+            return self.frames[name]
+        if name in self.spilled:
+            path = self.spilled.pop(name)
+            output = pd.read_pickle(path)
+            os.remove(path)
+            if isinstance(node, models.DataSource):
+                node.data, node.spill_path = output, None
+        elif name in self.futures:
+            output = self.collect(node)
+        else:
+            output = self.compute(node)
+
+        self.frames[name] = output
+        self.sizes[name] = frame_bytes(output)
+        if self.pending[name] <= 0:
+            # rebuilt for a retry after all of its consumers were counted, so
+            # nothing would release it later
+            self.release(node)
+        self.enforce_budget(keep={name})
+        self.submit_ready()
+        return output
+
+    def compute(self, node):
+        if node.name in self.futures:
+            return self.collect(node)
+        inputs = node_inputs(node)
+        first_attempt = node.name not in self.attempted
+        self.attempted.add(node.name)
+        try:
+            if isinstance(node, models.DataSource):
+                return node.get_data()
+            if isinstance(node, models.DataAsset):
+                output = ARTIFACTS.fetch(node.artifact_key())
+                if output is not None:
+                    return output
+            data = {key: self.get(input_) for key, input_ in inputs.items()}
+            if isinstance(node, models.Report):
+                return node.get_data(outputs=data)
+            if self.pool and node.cpu_bound:
+                output = self.submit(node, data).result()
+            else:
+                output = node.processer(data)
+            ARTIFACTS.publish(node.artifact_key(), output)
+            return output
+        finally:
+            if first_attempt:
+                for input_ in inputs.values():
+                    self.consumed(input_)
+
+    def submit(self, node, data):
+        shared = {
+            key: self.share(node.inputs[key], value) for key, value in data.items()
+        }
+        future = self.pool.submit(run_processer, node.processer, shared)
+        logging.info(f"Submitted {node} to process pool")
+        return future
+
+    def share(self, node, output):
+        if not isinstance(output, pd.DataFrame):
+            return output
+        if node.name not in self.shared:
+            self.shared[node.name] = SharedFrame(output)
+        return self.shared[node.name]
+
+    def submit_ready(self):
+        if self.pool is None:
+            return
+        for name, node in self.nodes.items():
+            ready = (
+                getattr(node, "cpu_bound", False)
+                and self.pending[name] > 0
+                and name not in self.attempted
+                and name not in self.futures
+                and name not in self.frames
+                and all(i.name in self.frames for i in node.inputs.values())
+            )
+            if ready:
+                data = {key: self.frames[i.name] for key, i in node.inputs.items()}
+                self.futures[name] = self.submit(node, data)
+
+    def collect(self, node):
+        future = self.futures.pop(node.name)
+        self.attempted.add(node.name)
+        try:
+            output = future.result()
+            ARTIFACTS.publish(node.artifact_key(), output)
+            return output
+        finally:
+            for input_ in node.inputs.values():
+                self.consumed(input_)
+
+    def consumed(self, node):
+        self.pending[node.name] -= 1
+        if self.pending[node.name] == 0:
+            self.release(node)
+
+    def release(self, node):
+        self.frames.pop(node.name, None)
+        if node.name in self.shared:
+            self.shared.pop(node.name).unlink()
+        logging.debug(f"Releasing {node}")
+        if isinstance(node, models.DataSource):
+            # keep a copy on disk for processers that call get_data() directly
+            if node.data is not None and self.release_sources:
+                node.spill_path = self.spill(node.name, node.data)
+                node.data = None
+            self.spilled.pop(node.name, None)
+        else:
+            path = self.spilled.pop(node.name, None)
+            if path:
+                os.remove(path)
+
+    def spill(self, name, output):
+        path = os.path.join(self.spill_dir, f"{slugify.slugify(name)}.pkl")
+        pd.to_pickle(output, path)
+        return path
+
+    def enforce_budget(self, keep):
+        if self.memory_budget is None:
+            return
+        sizes = {name: self.sizes[name] for name in self.frames}
+        resident = sum(sizes.values())
+        for name in sorted(sizes, key=sizes.get, reverse=True):
+            if resident <= self.memory_budget:
+                break
+            if name in keep or sizes[name] == 0:
+                continue
+            logging.info(f"Spilling {name} ({sizes[name] / 1e6:.0f}MB) to disk")
+            node = self.nodes[name]
+            self.spilled[name] = self.spill(name, self.frames.pop(name))
+            if isinstance(node, models.DataSource):
+                node.data, node.spill_path = None, self.spilled[name]
+            resident -= sizes[name]
+
+    def cleanup(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+        for shared in self.shared.values():
+            shared.unlink()
+        self.shared = {}
+        self.futures = {}
+        for node in self.nodes.values():
+            if isinstance(node, models.DataSource) and node.spill_path:
+                node.spill_path = None
+        self.frames = {}
+        self.spilled = {}
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
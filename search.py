@@ -0,0 +1,225 @@
+"""
+Inverted index for keyword search over documents keyed by an integer id.
+
+The index is a sorted vocabulary of utf-8 tokens with a posting list of
+sorted ids per token, saved as flat .npy arrays. Loaded memory-mapped, a
+query reads only the postings of its terms; the index is also picklable, so
+it can be published as an artifact. Filters (e.g. area or status)
+are indexed as field:value tokens and applied as more posting intersections.
+When the documents change only the changed ones are tokenized again.
+"""
+import functools
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+import changes
+from utils import CACHE_DIR, atomic_write, to_pickle_atomic
+
+SEARCH_DIR = os.path.join(CACHE_DIR, "search")
+ARRAYS = ["vocab", "offsets", "postings", "ids", "name_offsets", "names"]
+TOKEN = r"\w+"
+
+
+def tokenize(text):
+    return [token.encode() for token in re.findall(TOKEN, text.lower())]
+
+
+def field_token(field, value):
+    return f"{field}:{value}".lower().encode()
+
+
+def document_tokens(docs, key, text_cols, field_cols):
+    """
+    Distinct (token, id) pairs for docs: the words of text_cols and a
+    field:value token for each value of field_cols (which may hold lists)
+    """
+    ids = docs[key].to_numpy()
+    text = functools.reduce(
+        lambda a, b: a + " " + b,
+        [docs[col].fillna("").astype(str) for col in text_cols],
+    )
+    words = text.str.lower().str.findall(TOKEN)
+    parts = [pd.Series(words.to_numpy(), index=ids).explode()]
+    for col in field_cols:
+        values = pd.Series(docs[col].to_numpy(), index=ids).explode().dropna()
+        parts.append(f"{col}:" + values.astype(str).str.lower())
+    pairs = pd.concat(parts).dropna().rename("token").rename_axis("id")
+    pairs = pairs.reset_index().drop_duplicates()
+    # encode each distinct token once
+    codes, uniques = pd.factorize(pairs["token"])
+    encoded = np.array([token.encode() for token in uniques], dtype="S")
+    return encoded[codes], pairs["id"].to_numpy(dtype="int32")
+
+
+def encode_names(names):
+    encoded = [name.encode() for name in names.fillna("").astype(str)]
+    offsets = np.zeros(len(encoded) + 1, dtype="int64")
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype="uint8")
+
+
+class SearchIndex:
+    def __init__(self, vocab, offsets, postings, ids, name_offsets, names):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.postings = postings
+        self.ids = ids
+        self.name_offsets = name_offsets
+        self.names = names
+
+    @classmethod
+    def build(cls, tokens, ids, docs, key, name_col):
+        """From (token, id) pairs, deduplicated, and the documents' names"""
+        vocab, token_idx = np.unique(tokens, return_inverse=True)
+        order = np.lexsort((ids, token_idx))
+        counts = np.bincount(token_idx, minlength=len(vocab))
+        offsets = np.zeros(len(vocab) + 1, dtype="int64")
+        np.cumsum(counts, out=offsets[1:])
+        docs = docs.sort_values(key)
+        name_offsets, names = encode_names(docs[name_col])
+        return cls(
+            vocab=vocab,
+            offsets=offsets,
+            postings=ids[order].astype("int32"),
+            ids=docs[key].to_numpy(dtype="int32"),
+            name_offsets=name_offsets,
+            names=names,
+        )
+
+    @classmethod
+    def load(cls, directory=SEARCH_DIR, mmap_mode="r"):
+        return cls(
+            **{
+                name: np.load(
+                    os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode
+                )
+                for name in ARRAYS
+            }
+        )
+
+    def save(self, directory=SEARCH_DIR):
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            with atomic_write(os.path.join(directory, f"{name}.npy")) as f:
+                np.save(f, getattr(self, name))
+
+    def pairs(self):
+        """(token, id) pairs of the whole index"""
+        counts = np.diff(self.offsets)
+        return np.repeat(np.asarray(self.vocab), counts), np.asarray(self.postings)
+
+    def posting(self, token):
+        i = np.searchsorted(self.vocab, token)
+        if i == len(self.vocab) or self.vocab[i] != token:
+            return np.empty(0, dtype="int32")
+        return self.postings[self.offsets[i] : self.offsets[i + 1]]
+
+    def match(self, tokens):
+        """Ids of the documents with every token"""
+        postings = sorted((self.posting(t) for t in tokens), key=len)
+        if not postings:
+            return np.empty(0, dtype="int32")
+        return functools.reduce(
+            lambda a, b: np.intersect1d(a, b, assume_unique=True), postings
+        )
+
+    def name(self, id):
+        i = np.searchsorted(self.ids, id)
+        start, end = self.name_offsets[i], self.name_offsets[i + 1]
+        return bytes(self.names[start:end]).decode()
+
+    def vocabulary(self):
+        return pd.DataFrame(
+            {
+                "token": pd.Series(np.asarray(self.vocab)).str.decode("utf-8"),
+                "documents": np.diff(self.offsets),
+            }
+        )
+
+
+def has_index(directory=SEARCH_DIR):
+    return all(
+        os.path.exists(os.path.join(directory, f"{name}.npy")) for name in ARRAYS
+    )
+
+
+def install_index(index, directory=SEARCH_DIR):
+    """
+    Save an index built elsewhere (e.g. fetched from the artifact store) to
+    directory, to be searched memory-mapped. Forgets the documents indexed
+    there, so the next update_index starts over rather than patching it.
+    """
+    if has_index(directory):
+        saved = SearchIndex.load(directory)
+        if all(
+            np.array_equal(getattr(saved, name), getattr(index, name))
+            for name in ARRAYS
+        ):
+            # e.g. just built here by update_index, keep it incremental
+            return
+    index.save(directory)
+    indexed_path = os.path.join(directory, "indexed.pkl")
+    if os.path.exists(indexed_path):
+        os.remove(indexed_path)
+
+
+def update_index(docs, key, text_cols, field_cols, name_col, directory=SEARCH_DIR):
+    """
+    Bring the index in directory up to date with docs, tokenizing only the
+    documents inserted or changed since it was last built. Returns the index
+    in memory rather than mapped from directory.
+    """
+    cols = list(dict.fromkeys([key, name_col] + text_cols + field_cols))
+    docs = docs[cols].drop_duplicates(key)
+    indexed_path = os.path.join(directory, "indexed.pkl")
+    previous = None
+    if os.path.exists(indexed_path) and has_index(directory):
+        previous = pd.read_pickle(indexed_path)
+        # field columns may hold lists, which don't hash
+        delta = changes.diff(
+            stringify(previous, field_cols), stringify(docs, field_cols), key
+        )
+
+    if previous is None:
+        tokens, ids = document_tokens(docs, key, text_cols, field_cols)
+    elif len(delta) == 0:
+        return SearchIndex.load(directory, mmap_mode=None)
+    else:
+        logging.info(f"Updating search index: {delta.summary()}")
+        stale = pd.concat([delta.updated[key], delta.removed[key]]).to_numpy()
+        tokens, ids = SearchIndex.load(directory).pairs()
+        keep = ~np.isin(ids, stale)
+        fresh = docs[
+            docs[key].isin(pd.concat([delta.inserted[key], delta.updated[key]]))
+        ]
+        new_tokens, new_ids = document_tokens(fresh, key, text_cols, field_cols)
+        tokens = np.concatenate([tokens[keep], new_tokens])
+        ids = np.concatenate([ids[keep], new_ids])
+
+    index = SearchIndex.build(tokens, ids, docs, key, name_col)
+    index.save(directory)
+    to_pickle_atomic(docs, indexed_path)
+    return index
+
+
+def stringify(df, cols):
+    return df.assign(**{col: df[col].astype(str) for col in cols})
+
+
+def search(query, filters=None, index=None, directory=SEARCH_DIR):
+    """
+    (id, name) of the documents with every word of query and the given
+    field values, e.g. filters={"utla_code": "E06000001"}. Searches index if
+    given, otherwise the one saved in directory.
+    """
+    if index is None:
+        index = SearchIndex.load(directory)
+    tokens = tokenize(query)
+    for field, value in (filters or {}).items():
+        if value is not None:
+            tokens.append(field_token(field, value))
+    return [(int(id), index.name(id)) for id in index.match(tokens)]
@@ -0,0 +1,129 @@
+import pickle
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+
+def encode_strings(values):
+    """
+    utf-8 bytes of strings laid end to end, and the offset of each. Encoded
+    as one NUL separated string rather than one at a time, unless a string
+    holds a NUL itself.
+    """
+    joined = np.frombuffer("\0".join(values).encode(), dtype=np.uint8)
+    separators = np.flatnonzero(joined == 0)
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    if len(separators) == len(values) - 1:
+        offsets[1:-1] = separators - np.arange(len(separators))
+        offsets[-1] = len(joined) - len(separators)
+        return np.delete(joined, separators), offsets
+    encoded = [v.encode() for v in values]
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def decode_strings(data, offsets):
+    """Inverse of encode_strings, as an object array"""
+    values = np.empty(len(offsets) - 1, dtype=object)
+    if not (data == 0).any():
+        joined = np.insert(data, offsets[1:-1], 0).tobytes().decode()
+        values[:] = joined.split("\0") if len(values) else []
+        return values
+    data = data.tobytes()
+    for i, (start, end) in enumerate(zip(offsets[:-1], offsets[1:])):
+        values[i] = data[start:end].decode()
+    return values
+
+
+class SharedFrame:
+    """
+    A DataFrame laid out in one shared memory block, so it can be handed to a
+    worker process without pickling the data. Only this small handle is
+    pickled; the worker rebuilds the frame from the block.
+
+    Numeric, bool and datetime columns are stored as raw arrays, string
+    columns as utf-8 bytes plus offsets (as in Arrow), categoricals as codes.
+    Anything else is pickled into the block.
+    """
+
+    def __init__(self, df):
+        if isinstance(df.index, pd.RangeIndex):
+            self.range_index = (df.index.start, df.index.stop, df.index.step)
+            parts = []
+        else:
+            self.range_index = None
+            parts = [(None, self.encode(pd.Series(df.index)))]
+        parts += [(col, self.encode(df[col])) for col in df.columns]
+
+        size = sum(len(buf) for _, (_, buffers, _) in parts for buf in buffers)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.name = self.shm.name
+        self.index_name = df.index.name
+        self.columns = []
+        offset = 0
+        for col, (kind, buffers, meta) in parts:
+            spans = []
+            for buf in buffers:
+                self.shm.buf[offset : offset + len(buf)] = buf
+                spans.append((offset, len(buf)))
+                offset += len(buf)
+            self.columns.append((col, kind, spans, meta))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["shm"]
+        return state
+
+    @staticmethod
+    def encode(s):
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codes = np.ascontiguousarray(s.cat.codes.to_numpy())
+            meta = (codes.dtype.str, s.cat.categories, s.cat.ordered)
+            return "category", [codes.view(np.uint8)], meta
+        if isinstance(s.dtype, np.dtype) and s.dtype.kind in "biufcmM":
+            arr = np.ascontiguousarray(s.to_numpy())
+            return "array", [arr.view(np.uint8)], arr.dtype.str
+        values = s.to_numpy(dtype=object)
+        is_null = pd.isnull(values)
+        is_str = pd.api.types.infer_dtype(values[~is_null]) in ("string", "empty")
+        if is_str:
+            data, offsets = encode_strings(np.where(is_null, "", values))
+            buffers = [data, offsets.view(np.uint8), is_null.view(np.uint8)]
+            return "str", buffers, None
+        return "pickle", [np.frombuffer(pickle.dumps(s.to_numpy()), np.uint8)], None
+
+    def decode(self, buf, kind, spans, meta):
+        views = [buf[start : start + n] for start, n in spans]
+        if kind == "array":
+            return np.frombuffer(views[0], dtype=np.dtype(meta)).copy()
+        if kind == "category":
+            dtype, categories, ordered = meta
+            codes = np.frombuffer(views[0], dtype=np.dtype(dtype)).copy()
+            return pd.Categorical.from_codes(codes, categories, ordered=ordered)
+        if kind == "str":
+            values = decode_strings(
+                np.frombuffer(views[0], dtype=np.uint8),
+                np.frombuffer(views[1], dtype=np.int64),
+            )
+            values[np.frombuffer(views[2], dtype=bool)] = None
+            return values
+        return pickle.loads(views[0])
+
+    def to_frame(self):
+        shm = shared_memory.SharedMemory(name=self.name)
+        try:
+            buf = shm.buf
+            columns = [(col, self.decode(buf, *spec)) for col, *spec in self.columns]
+            del buf
+        finally:
+            shm.close()
+        if self.range_index is not None:
+            index = pd.RangeIndex(*self.range_index, name=self.index_name)
+        else:
+            index = pd.Index(columns.pop(0)[1], name=self.index_name)
+        return pd.DataFrame(dict(columns), index=index, columns=[c for c, _ in columns])
+
+    def unlink(self):
+        self.shm.close()
+        self.shm.unlink()
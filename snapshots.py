@@ -0,0 +1,118 @@
+"""
+History of every ingested version of a source, stored as a base plus deltas.
+
+Each row version is kept once with the snapshots it is valid for, from
+valid_from up to but not including valid_to (slowly changing dimension, type
+2). A new extract only closes the rows of keys that changed or were removed
+and adds the rows of keys that changed or were inserted, so the store grows
+with the changes rather than the register. Any snapshot can be rebuilt with
+one filter, and counts over time come from the intervals without rebuilding
+any snapshot.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from changes import state_dir
+from utils import atomic_write, to_pickle_atomic
+
+OPEN = np.iinfo("int32").max  # valid_to of rows in the latest snapshot
+
+
+def history_path(name):
+    return os.path.join(state_dir(name), "history.pkl")
+
+
+def read_snapshots(name):
+    """[{"date", "version"}] for each snapshot of a source, oldest first"""
+    try:
+        with open(os.path.join(state_dir(name), "snapshots.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def write_snapshots(name, snapshots):
+    path = os.path.join(state_dir(name), "snapshots.json")
+    with atomic_write(path, "w") as f:
+        json.dump(snapshots, f, indent=1)
+
+
+def history(name):
+    path = history_path(name)
+    return pd.read_pickle(path) if os.path.exists(path) else None
+
+
+def record(name, df, key, date, version, delta=None):
+    """
+    Add version of a source as a new snapshot. delta is the change from the
+    previous snapshot (see changes.capture); without one the whole of df is
+    stored and every row of the previous snapshot closed.
+    """
+    snapshots = read_snapshots(name)
+    if any(s["version"] == version for s in snapshots):
+        return
+    i = len(snapshots)
+    rows = history(name)
+
+    if rows is None or delta is None:
+        if rows is not None:
+            rows.loc[rows["valid_to"] == OPEN, "valid_to"] = i
+        new = df
+    else:
+        changed = pd.concat([delta.updated[key], delta.removed[key]]).unique()
+        close = (rows["valid_to"] == OPEN) & rows[key].isin(changed)
+        rows.loc[close, "valid_to"] = i
+        new = pd.concat([delta.inserted, delta.updated])
+
+    new = new.assign(valid_from=np.int32(i), valid_to=np.int32(OPEN)).reset_index(
+        drop=True
+    )
+    rows = new if rows is None else pd.concat([rows, new], ignore_index=True)
+
+    to_pickle_atomic(rows, history_path(name))
+    snapshots.append({"date": date.isoformat() if date else None, "version": version})
+    write_snapshots(name, snapshots)
+
+
+def snapshot_dates(name):
+    return pd.DatetimeIndex([s["date"] for s in read_snapshots(name)])
+
+
+def as_of(name, date):
+    """The source as in the latest snapshot on or before date"""
+    dates = snapshot_dates(name)
+    i = dates.searchsorted(pd.Timestamp(date), side="right") - 1
+    if i < 0:
+        raise KeyError(f"No snapshot of {name} on or before {date}")
+    rows = history(name)
+    rows = rows[(rows["valid_from"] <= i) & (rows["valid_to"] > i)]
+    return rows.drop(columns=["valid_from", "valid_to"]).reset_index(drop=True)
+
+
+def counts_over_time(name, by, key=None, where=None):
+    """
+    Rows (or distinct keys) per value of by in every snapshot, as a frame of
+    snapshot date x group. where filters the row versions first, e.g. to
+    registered charities. Rows with no value of by are left out. Each row
+    version adds one to its group at
+    valid_from and takes one away at valid_to; a cumulative sum over
+    snapshots gives the counts.
+    """
+    rows = history(name)
+    dates = snapshot_dates(name)
+    if where is not None:
+        rows = rows[where(rows)]
+    rows = rows[rows[by].notnull()]
+    if key is not None:
+        rows = rows.drop_duplicates([key, by, "valid_from"])
+    groups, group_idx = np.unique(rows[by].astype(str), return_inverse=True)
+
+    changes = np.zeros((len(dates) + 1, len(groups)), dtype="int64")
+    np.add.at(changes, (rows["valid_from"].to_numpy(), group_idx), 1)
+    ends = np.minimum(rows["valid_to"].to_numpy(), len(dates))
+    np.add.at(changes, (ends, group_idx), -1)
+    counts = np.cumsum(changes[:-1], axis=0)
+    return pd.DataFrame(counts, index=dates, columns=groups)
@@ -2,16 +2,18 @@ import os
 
 import pandas as pd
 
+from excel import Workbook
 from models import DataAsset, DataDate, DataSource, DateMeta, Organisations, SourceType
 from plotting import hex
 from sources.public.census import POP_LA
-from utils import CACHE, DATA_DIR
+from utils import DATA_DIR, FileProbe
 
 TT_DATA = {
     "fname": "Trussell Trust - just LA 2022.xlsx",
     "publish_date": pd.to_datetime("2022-04-01"),
     "latest_date": pd.to_datetime("2022-03-31"),
 }
+TT_PATH = os.path.join(DATA_DIR, TT_DATA["fname"])
 
 TT_COLS = [
     "Number of parcels given to adults",
@@ -19,12 +21,11 @@ TT_COLS = [
     "Total number of parcels distributed",
     "Number of distribution centres",
 ]
+TT_WORKBOOK = Workbook(TT_PATH, usecols=["Local Authority"] + TT_COLS, module=__name__)
 
 
-@CACHE.memoize()
 def read_trusselltrust():
-    path = os.path.join(DATA_DIR, TT_DATA["fname"])
-    df = pd.read_excel(path)
+    df = TT_WORKBOOK.read()
 
     df = df.rename(columns={"Local Authority": "la_name"})
     ons_codes = POP_LA.get_data()[["la_code", "la_name"]]
@@ -39,7 +40,7 @@ def read_trusselltrust():
 
 def normalise_trussell_data(data):
     df = data["trussell"]  # .dropna(subset=['la_code'])
-    pop = POP_LA.get_data()[["la_code", "population"]]
+    pop = data["pop"][["la_code", "population"]]
     df = pd.merge(df, pop)
     df[TT_COLS] = df[TT_COLS].divide(df["population"], axis=0)
     df = df.sort_values("Total number of parcels distributed", ascending=False)
@@ -53,11 +54,12 @@ TrussellTrust = DataSource(
     org=Organisations.trussell_trust,
     description="Food parcels delivered by local authority",
     dateMeta=DateMeta(update_freq=pd.Timedelta("365 days")),
+    probe=FileProbe(TT_PATH),
 )
 
 TrussellTrustProportional = DataAsset(
     name="Trussell trust per head",
-    inputs={"trussell": TrussellTrust},
+    inputs={"trussell": TrussellTrust, "pop": POP_LA},
     processer=normalise_trussell_data,
 )
 
@@ -2,14 +2,19 @@ import os
 
 import pandas as pd
 
+from excel import Workbook
 from models import DataAsset, DataDate, DataSource, DateMeta, Organisations, SourceType
 from sources.public.census import POP_LA
-from utils import CACHE, DATA_DIR
+from utils import DATA_DIR, FileProbe
 
 TURN2US_DATA = {
     "fname": "08.07.2020 - Turn 2 Us Data.xlsx",
     "publish_date": pd.to_datetime("2020-07-08"),
 }
+TURN2US_PATH = os.path.join(DATA_DIR, TURN2US_DATA["fname"])
+TURN2US_WORKBOOK = Workbook(
+    TURN2US_PATH, parse_dates=["Application Date"], module=__name__
+)
 
 TURN2US_LA_MATCH = {
     "Bournemouth": "E06000028",
@@ -41,10 +46,8 @@ TURN2US_LA_MATCH = {
 }
 
 
-@CACHE.memoize()
 def read_turn2us():
-    path = os.path.join(DATA_DIR, TURN2US_DATA["fname"])
-    df = pd.read_excel(path, parse_dates=["Application Date"])
+    df = TURN2US_WORKBOOK.read()
 
     df = df.rename(columns={"Local Authority": "la_name"})
     ons_codes = POP_LA.get_data()[["la_code", "la_name"]]
@@ -82,6 +85,7 @@ Turn2us = DataSource(
     org=Organisations.turn2us,
     description="",
     dateMeta=DateMeta(update_freq=pd.Timedelta("365 days")),
+    probe=FileProbe(TURN2US_PATH),
 )
 
 
@@ -1,11 +1,13 @@
-import io
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 import pandas as pd
 import requests
 
 from models import DataAsset, DataDate, DataSource, DateMeta, Organisations, SourceType
-from utils import DATA_DIR
+from utils import CACHE_DIR, DATA_DIR, to_pickle_atomic
 
 ONS_API_ENDPOINT = "https://api.beta.ons.gov.uk/v1/datasets/{id}"
 ETHNICITY_ID = "TS021"
@@ -13,67 +15,206 @@ AGE_SEX_LA_ID = "TS009"
 
 TEN_YEARS = pd.Timedelta(10 * 365, unit="days")
 
+CENSUS_CACHE_DIR = os.path.join(CACHE_DIR, "census")
+CHUNK_ROWS = 50_000
+CENSUS_FETCH_THREADS = 8
+
 CENSUS_LA_COL_MAP = {
     "Lower tier local authorities Code": "la_code",
     "Lower tier local authorities": "la_name",
 }
 
 
-def get_ons_latest_df_and_date(id):
+def ons_latest_version(id):
+    """Probe token for an ONS dataset: the url of its latest version"""
     dataset_info = requests.get(ONS_API_ENDPOINT.format(id=id))
-    latest_dataset = requests.get(
-        dataset_info.json()["links"]["latest_version"]["href"]
-    )
-    publish_date = pd.to_datetime(latest_dataset.json()["release_date"]).replace(
-        tzinfo=None
-    )
-    csv_url = latest_dataset.json()["downloads"]["csv"]["href"]
+    return dataset_info.json()["links"]["latest_version"]["href"]
+
+
+def ons_latest_version_info(id):
+    """Metadata of the latest version of an ONS dataset: edition, version, downloads"""
+    return requests.get(ons_latest_version(id)).json()
+
+
+def ons_cache_path(info, name):
+    """Cache file for something derived from one (id, edition, version)"""
+    fname = f"{info['dataset_id']}_{info['edition']}_{info['version']}_{name}.pkl"
+    return os.path.join(CENSUS_CACHE_DIR, fname)
 
-    r = requests.get(csv_url)
-    return pd.read_csv(io.StringIO(r.content.decode("utf-8"))), publish_date
 
+def ons_latest_versions(ids):
+    """Probe token for several ONS datasets"""
+    with ThreadPoolExecutor(CENSUS_FETCH_THREADS) as pool:
+        return "|".join(pool.map(ons_latest_version, ids))
 
-def get_census_ethnicity():
-    df, publish_date = get_ons_latest_df_and_date(ETHNICITY_ID)
-    df = df.rename(columns=CENSUS_LA_COL_MAP)
-    df = df.pivot(
-        index=CENSUS_LA_COL_MAP.values(),
-        columns="Ethnic group (20 categories)",
-        values="Observation",
-    ).reset_index()
-    return DataDate(df, DateMeta(publish_date=publish_date))
 
+def ons_publish_date(info):
+    return pd.to_datetime(info["release_date"]).replace(tzinfo=None)
 
-def get_census_age_sex():
-    df, publish_date = get_ons_latest_df_and_date(AGE_SEX_LA_ID)
-    df = df.rename(columns=CENSUS_LA_COL_MAP)
-    df = df.rename(columns={"Observation": "population"})
-    return DataDate(df, DateMeta(publish_date=publish_date))
+
+def get_ons_table(id):
+    """
+    Latest version of an ONS census table with the LA columns renamed, cached
+    for its (id, edition, version)
+    """
+    info = ons_latest_version_info(id)
+    path = ons_cache_path(info, "table")
+    if os.path.exists(path):
+        return pd.read_pickle(path), info
+
+    logging.info(f"Downloading {id} version {info['version']}")
+    df = pd.concat(stream_ons_csv(info["downloads"]["csv"]["href"]))
+    df = df.rename(columns=CENSUS_LA_COL_MAP).reset_index(drop=True)
+    to_pickle_atomic(df, path)
+    return df, info
+
+
+def get_census_tables(pivot):
+    """
+    Fetch census tables concurrently and spread each one to an LA-keyed wide
+    frame. pivot maps table id -> the column whose categories become columns;
+    with more than one table the columns are prefixed by table id.
+    """
+    la_cols = list(CENSUS_LA_COL_MAP.values())
+    with ThreadPoolExecutor(CENSUS_FETCH_THREADS) as pool:
+        tables = list(pool.map(get_ons_table, pivot))
+
+    wide = None
+    for (id, column), (df, _) in zip(pivot.items(), tables):
+        df = df.pivot(index=la_cols, columns=column, values="Observation")
+        df.columns.name = None
+        if len(pivot) > 1:
+            df = df.add_prefix(f"{id}: ")
+        wide = df if wide is None else wide.join(df, how="outer")
+
+    publish_date = max(ons_publish_date(info) for _, info in tables)
+    return DataDate(wide.reset_index(), DateMeta(publish_date=publish_date))
+
+
+def census_source(name, pivot, url="https://census.gov.uk/"):
+    """DataSource of LA-keyed census tables, see get_census_tables"""
+    return DataSource(
+        name=name,
+        data_getter=partial(get_census_tables, pivot),
+        probe=partial(ons_latest_versions, list(pivot)),
+        org=Organisations.ons,
+        sub_org="Census2021",
+        source_type=SourceType.api,
+        url=url,
+        dateMeta=DateMeta(update_freq=TEN_YEARS),
+    )
+
+
+# grain -> columns kept alongside the LA columns when aggregating TS009
+AGE_SEX_GRAINS = {
+    "la": [],
+    "sex": ["sex"],
+    "age_band": ["age_band"],
+    "age": ["sex", "age"],
+}
+AGE_BANDS = list(range(0, 90, 5)) + [float("inf")]
+AGE_BAND_LABELS = [f"{a}-{a + 4}" for a in AGE_BANDS[:-2]] + ["85+"]
+
+
+def age_sex_columns(col):
+    """Name used for a TS009 column, or None for columns that aren't read"""
+    if col in CENSUS_LA_COL_MAP:
+        return CENSUS_LA_COL_MAP[col]
+    if col.startswith("Sex") and not col.endswith("Code"):
+        return "sex"
+    if col.startswith("Age") and col.endswith("Code"):
+        return "age"
+    if col == "Observation":
+        return "population"
+    return None
+
+
+def aggregate_age_sex(chunks):
+    """
+    Sum streamed TS009 chunks to every grain in AGE_SEX_GRAINS, keeping only
+    the running totals rather than the single year of age rows
+    """
+    la_cols = list(CENSUS_LA_COL_MAP.values())
+    totals = {}
+    for chunk in chunks:
+        chunk = chunk.rename(columns=age_sex_columns)
+        chunk["age"] = pd.to_numeric(chunk["age"], errors="coerce")
+        chunk["age_band"] = pd.cut(
+            chunk["age"], AGE_BANDS, right=False, labels=AGE_BAND_LABELS
+        )
+        for grain, cols in AGE_SEX_GRAINS.items():
+            part = chunk.groupby(la_cols + cols, observed=True)["population"].sum()
+            if grain in totals:
+                part = totals[grain].add(part, fill_value=0)
+            totals[grain] = part
+    return {
+        grain: total.astype("int64").reset_index() for grain, total in totals.items()
+    }
+
+
+def stream_ons_csv(url, chunksize=CHUNK_ROWS, usecols=None):
+    """Read a csv download in chunks without holding the whole body in memory"""
+    with requests.get(url, stream=True) as r:
+        r.raise_for_status()
+        r.raw.decode_content = True
+        reader = pd.read_csv(
+            r.raw,
+            chunksize=chunksize,
+            usecols=usecols,
+        )
+        yield from reader
+
+
+def get_census_age_sex(grain="age"):
+    """
+    TS009 summed to grain (see AGE_SEX_GRAINS). Every grain is aggregated in
+    the one streamed read and cached for the ONS dataset version, so later
+    calls for any grain don't download the table again.
+    """
+    info = ons_latest_version_info(AGE_SEX_LA_ID)
+    publish_date = ons_publish_date(info)
+
+    path = ons_cache_path(info, f"age_sex_{grain}")
+    if os.path.exists(path):
+        return DataDate(pd.read_pickle(path), DateMeta(publish_date=publish_date))
+
+    logging.info(f"Streaming {AGE_SEX_LA_ID} version {info['version']}")
+    chunks = stream_ons_csv(
+        info["downloads"]["csv"]["href"],
+        usecols=lambda col: age_sex_columns(col) is not None,
+    )
+    totals = aggregate_age_sex(chunks)
+    for name, df in totals.items():
+        to_pickle_atomic(df, ons_cache_path(info, f"age_sex_{name}"))
+    return DataDate(totals[grain], DateMeta(publish_date=publish_date))
 
 
 def group_populations(data):
-    df = data["age_sex_census"]
+    df = data["la_census"]
     la_cols = list(CENSUS_LA_COL_MAP.values())
-    print(df)
-    print(df.columns)
-    df = df[la_cols + ["population"]]
-    df = df.groupby(la_cols).sum().reset_index()
-    return df
+    return df[la_cols + ["population"]]
+
 
+ETHNICITY_LA = census_source(
+    "Ethnicity populations by LA",
+    {ETHNICITY_ID: "Ethnic group (20 categories)"},
+)
 
-ETHNICITY_LA = DataSource(
-    name="Ethnicity populations by LA",
-    data_getter=get_census_ethnicity,
+AGE_SEX_LA = DataSource(
+    name="LA populations: Sex by single year of age",
+    data_getter=partial(get_census_age_sex, grain="age"),
+    probe=partial(ons_latest_version, AGE_SEX_LA_ID),
     org=Organisations.ons,
     sub_org="Census2021",
     source_type=SourceType.api,
-    url="https://census.gov.uk/",
+    url="https://www.ons.gov.uk/datasets/TS009/editions/2021/versions/1",
     dateMeta=DateMeta(update_freq=TEN_YEARS),
 )
 
-AGE_SEX_LA = DataSource(
-    name="LA populations: Sex by single year of age",
-    data_getter=get_census_age_sex,
+LA_CENSUS = DataSource(
+    name="LA populations: Census totals",
+    data_getter=partial(get_census_age_sex, grain="la"),
+    probe=partial(ons_latest_version, AGE_SEX_LA_ID),
     org=Organisations.ons,
     sub_org="Census2021",
     source_type=SourceType.api,
@@ -83,6 +224,6 @@ AGE_SEX_LA = DataSource(
 
 POP_LA = DataAsset(
     name="LA populations",
-    inputs={"age_sex_census": AGE_SEX_LA},
+    inputs={"la_census": LA_CENSUS},
     processer=group_populations,
 )
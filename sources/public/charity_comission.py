@@ -7,14 +7,23 @@ from functools import partial
 import numpy as np
 import pandas as pd
 import requests
-import seaborn as sns
+from scipy import sparse
 
+import changes
+import search
+import snapshots
 from models import DataAsset, DataDate, DataSource, DateMeta, Organisations, SourceType
 from plotting import hex, style
 from sources.public.census import POP_LA
+from sources.public.charity_register import (
+    CharityRegister,
+    CharityTable,
+    charity_families,
+)
 from sources.public.geoportal import LTLA_UTLA
 from sources.public.levellingup import LVL_BY_UTLA
-from utils import CACHE, DATA_DIR
+from sources.public import postcodes
+from utils import url_probe
 
 CC_ENDPOINT = "https://ccewuksprdoneregsadata1.blob.core.windows.net/data/json/publicextract.charity.zip"
 CC_COLS = [
@@ -57,6 +66,7 @@ CC_COLS = [
 CC_AREA_EP = "https://ccewuksprdoneregsadata1.blob.core.windows.net/data/json/publicextract.charity_area_of_operation.zip"
 CC_CATEGORY_EP = "https://ccewuksprdoneregsadata1.blob.core.windows.net/data/json/publicextract.charity_classification.zip"
 CC_HISTORY_EP = "https://ccewuksprdoneregsadata1.blob.core.windows.net/data/json/publicextract.charity_annual_return_history.zip"
+CC_PARTA_EP = "https://ccewuksprdoneregsadata1.blob.core.windows.net/data/json/publicextract.charity_annual_return_parta.zip"
 
 
 APPROX_MONTH = pd.Timedelta("31 days")
@@ -76,28 +86,30 @@ def get_charity_commission_dataset(endpoint, fname):
     return DataDate(df, DateMeta(publish_date=date))
 
 
-@CACHE.memoize()
+# columns of the main table kept by CC_MAIN
+CC_MAIN_COLS = [
+    "organisation_number",
+    "registered_charity_number",
+    "linked_charity_number",
+    "charity_name",
+    "charity_type",
+    "charity_registration_status",
+    "charity_reporting_status",
+    "latest_income",
+    "latest_expenditure",
+    "charity_insolvent",
+    "charity_in_administration",
+    "charity_activities",
+    "charity_contact_postcode",
+]
+
+
 def get_cc_main():
     datadate = get_charity_commission_dataset(CC_ENDPOINT, "publicextract.charity.json")
-    datadate.df = datadate.df[
-        [
-            "organisation_number",
-            "registered_charity_number",
-            "linked_charity_number",
-            "charity_name",
-            "charity_type",
-            "charity_registration_status",
-            "charity_reporting_status",
-            "latest_income",
-            "latest_expenditure",
-            "charity_insolvent",
-            "charity_in_administration",
-        ]
-    ]
+    datadate.df = datadate.df[CC_MAIN_COLS]
     return datadate
 
 
-@CACHE.memoize()
 def get_cc_area():
     datadate = get_charity_commission_dataset(
         CC_AREA_EP, "publicextract.charity_area_of_operation.json"
@@ -114,7 +126,6 @@ def get_cc_area():
     return datadate
 
 
-@CACHE.memoize()
 def get_cc_category():
     datadate = get_charity_commission_dataset(
         CC_CATEGORY_EP, "publicextract.charity_classification.json"
@@ -139,10 +150,9 @@ def get_cc_history():
     return datadate
 
 
-@CACHE.memoize()
 def get_grantmaking():
     datadate = get_charity_commission_dataset(
-        "https://ccewuksprdoneregsadata1.blob.core.windows.net/data/json/publicextract.charity_annual_return_parta.zip",
+        CC_PARTA_EP,
         "publicextract.charity_annual_return_parta.json",
     )
     df = datadate.df
@@ -152,9 +162,8 @@ def get_grantmaking():
     return datadate
 
 
-@CACHE.memoize()
 def filter_active_charities(data):
-    df = data["cc"]
+    register = data["register"]
 
     # date_of_registration, ~30000 in last five years
     # acc fin period - not needed as report status covers this
@@ -163,14 +172,22 @@ def filter_active_charities(data):
     # 85% have email, 66% have website
     # Uniform spread between 0-80 descriptions
 
-    print("no filter N =", len(df))
-    # 'registered' or 'removed'
-    df = df[df["charity_registration_status"] == "Registered"]
-    # ~70% of registered charities have submission recieved, others are overdue or sim
-    df = df[df["charity_reporting_status"] == "Submission Received"]
+    print("no filter N =", len(register.tables["main"]))
+
+    def active(columns):
+        # 'registered' or 'removed'
+        return (
+            (columns["charity_registration_status"] == "Registered")
+            # ~70% of registered charities have submission recieved, others
+            # are overdue or sim
+            & (columns["charity_reporting_status"] == "Submission Received")
+            & (columns["charity_insolvent"] == False)
+            & (columns["charity_in_administration"] == False)
+        )
 
-    df = df[df["charity_insolvent"] == False]
-    df = df[df["charity_in_administration"] == False]
+    df = register.semi_join(
+        register.tables["main"].to_frame(), register.bitmap("main", where=active)
+    )
     print("after filter N =", len(df))
 
     if False:
@@ -196,10 +213,14 @@ def filter_active_charities(data):
 CC_MAIN = DataSource(
     name="Charity comission summary table",
     data_getter=get_cc_main,
+    version=",".join(CC_MAIN_COLS),
+    change_key="organisation_number",
+    probe=partial(url_probe, CC_ENDPOINT),
     org=Organisations.charity_commission,
     source_type=SourceType.webscrape,
     url="https://register-of-charities.charitycommission.gov.uk/register/full-register-download",
     dateMeta=DateMeta(update_freq=APPROX_MONTH),
+    stale_while_revalidate=True,
     description="""
     Summary info of charities registered in England & Wales
     """,
@@ -209,10 +230,13 @@ CC_MAIN = DataSource(
 CC_AREA = DataSource(
     name="Charity area of operation",
     data_getter=get_cc_area,
+    change_key="organisation_number",
+    probe=partial(url_probe, CC_AREA_EP),
     org=Organisations.charity_commission,
     source_type=SourceType.webscrape,
     url="https://register-of-charities.charitycommission.gov.uk/register/full-register-download",
     dateMeta=DateMeta(update_freq=APPROX_MONTH),
+    stale_while_revalidate=True,
     description="""
     Each row describes a charity and a geography.
     Charities often record multiple levels or geography,
@@ -223,10 +247,12 @@ CC_AREA = DataSource(
 CC_CATEGORY = DataSource(
     name="Charity categories",
     data_getter=get_cc_category,
+    probe=partial(url_probe, CC_CATEGORY_EP),
     org=Organisations.charity_commission,
     source_type=SourceType.webscrape,
     url="https://register-of-charities.charitycommission.gov.uk/register/full-register-download",
     dateMeta=DateMeta(update_freq=APPROX_MONTH),
+    stale_while_revalidate=True,
     description="""
     """,
 )
@@ -234,10 +260,12 @@ CC_CATEGORY = DataSource(
 CC_HISTORY = DataSource(
     name="Charity annual return history",
     data_getter=get_cc_history,
+    probe=partial(url_probe, CC_HISTORY_EP),
     org=Organisations.charity_commission,
     source_type=SourceType.webscrape,
     url="https://register-of-charities.charitycommission.gov.uk/register/full-register-download",
     dateMeta=DateMeta(update_freq=APPROX_MONTH),
+    stale_while_revalidate=True,
     description="""
     """,
 )
@@ -245,25 +273,92 @@ CC_HISTORY = DataSource(
 CC_GRANTMAKER = DataSource(
     name="Charity org number grantmaking flag",
     data_getter=get_grantmaking,
+    probe=partial(url_probe, CC_PARTA_EP),
     org=Organisations.charity_commission,
     source_type=SourceType.webscrape,
     url="https://register-of-charities.charitycommission.gov.uk/register/full-register-download",
     dateMeta=DateMeta(update_freq=APPROX_MONTH),
+    stale_while_revalidate=True,
     description="""
     """,
 )
 
 
-def remove_grantmakers(df):
-    print("removing grant makers")
-    return df[
-        df["organisation_number"].isin(CC_GRANTMAKER.get_data()["organisation_number"])
+def area_counts_by_month(data):
+    # CC_AREA is an input so the latest extract is in the snapshot store
+    df = snapshots.counts_over_time(
+        CC_AREA.name,
+        "geographic_area_description",
+        key="organisation_number",
+        where=lambda rows: rows["geographic_area_type"] == "Local Authority",
+    )
+    # the latest extract in each month
+    return df.groupby(df.index.to_period("M")).last()
+
+
+CC_AREA_MONTHLY = DataAsset(
+    name="Charities operating in each local authority by month",
+    inputs={"cc_area": CC_AREA},
+    processer=area_counts_by_month,
+    description="From every Charity Commission extract ingested so far.",
+)
+
+
+def link_charity_families(data):
+    df = data["cc"][
+        [
+            "organisation_number",
+            "registered_charity_number",
+            "linked_charity_number",
+            "latest_expenditure",
+        ]
     ]
+    df = df.assign(family_id=charity_families(df))
+    # a main charity's accounts cover its linked charities, so a family's
+    # spend is the main charity's unless it reports none
+    is_main = df["linked_charity_number"] == 0
+    spending = df.loc[is_main & (df["latest_expenditure"] > 0), "family_id"]
+    df["counts_spend"] = is_main | ~df["family_id"].isin(spending)
+    return df.drop(columns="latest_expenditure")
+
+
+CC_FAMILIES = DataAsset(
+    name="Charity families",
+    inputs={"cc": CC_MAIN},
+    processer=link_charity_families,
+    description=(
+        "Main charities with their linked charities, by family_id, and whether"
+        " each one's spend counts towards its family's."
+    ),
+)
+
+
+def build_charity_register(data):
+    return CharityRegister(**data)
+
+
+# only the tables the register's consumers join on, so the large history and
+# classification frames can be released once their own assets have run
+CC_REGISTER = DataAsset(
+    name="Charity register",
+    inputs={
+        "main": CC_MAIN,
+        "area": CC_AREA,
+        "grantmakers": CC_GRANTMAKER,
+    },
+    processer=build_charity_register,
+    description="The CC tables column-wise by organisation_number, see CharityRegister.",
+)
+
+
+def remove_grantmakers(df, register):
+    print("removing grant makers")
+    return register.semi_join(df, register.bitmap("grantmakers"))
 
 
 CC_ACTIVE = DataAsset(
     name="Estimated active charities",
-    inputs={"cc": CC_MAIN, "cc_cat": CC_CATEGORY},
+    inputs={"register": CC_REGISTER},
     processer=filter_active_charities,
 )
 
@@ -284,20 +379,46 @@ def clean_utla_names(s):
 
 
 def charities_by_la(data):
-    cc = data["CC"]
-    area = data["CC_Area"]
+    register = data["register"]
     lkp = data["ltla_utla"]
 
-    # merge so that only active charities are kept
-    cc = remove_grantmakers(cc)
+    # keep areas of charities in the main table that pass remove_grantmakers
     drop_cols = ["linked_charity_number"]
-    org_id_cols = ["organisation_number", "registered_charity_number"]
     split_cols = ["latest_expenditure", "latest_income"]
-    df = area.drop(columns=drop_cols,).merge(
-        cc[org_id_cols + split_cols],
-        on=["organisation_number", "registered_charity_number"],
-        how="inner",
+    area = register.tables["area"].to_frame().drop(columns=drop_cols)
+    df = register.semi_join(remove_grantmakers(area, register), register.bitmap("main"))
+    regno = register.lookup(
+        "main", df["organisation_number"], "registered_charity_number"
     )
+    df = df[regno == df["registered_charity_number"].to_numpy()].copy()
+    for col in split_cols:
+        df[col] = register.lookup("main", df["organisation_number"], col)
+    df["area_from_postcode"] = False
+
+    # charities with no area of operation at all fall back to the LA of their
+    # contact postcode, when the postcode lookup has been downloaded
+    if data["postcodes"] is None:
+        logging.warning("No postcode lookup, charities without areas are left out")
+    else:
+        cc = remove_grantmakers(register.tables["main"].to_frame(), register)
+        missing = register.anti_join(cc, register.bitmap("area"))
+        la_codes = postcodes.lookup(
+            missing["charity_contact_postcode"], data["postcodes"]
+        )["la_code"]
+        la_names = lkp.drop_duplicates("la_code").set_index("la_code")["utla_name"]
+        fallback = missing.assign(
+            geographic_area_type="Local Authority",
+            geographic_area_description=la_codes.map(la_names),
+            area_from_postcode=True,
+        ).dropna(subset=["geographic_area_description"])
+        logging.info(f"{len(fallback)} charities located by contact postcode")
+        df = pd.concat([df, fallback[df.columns]], ignore_index=True)
+
+    families = CharityTable(data["families"])
+    df["family_id"] = families.lookup(df["organisation_number"], "family_id")
+    # so a family's spend isn't counted again through its linked charities
+    counts_spend = families.lookup(df["organisation_number"], "counts_spend")
+    df.loc[counts_spend == False, split_cols] = 0
 
     # only interested in charities with a LA documented
     df = df[df["geographic_area_type"] == "Local Authority"]
@@ -308,15 +429,9 @@ def charities_by_la(data):
     )
 
     # split expenditure over las mentioned per charity
-    split_las = df["organisation_number"].value_counts()
-    split_las = pd.DataFrame(split_las).reset_index()
-    split_las = split_las.rename(
-        columns={
-            "index": "organisation_number",
-            "organisation_number": "split",
-        }
+    df["split"] = df.groupby("organisation_number")["organisation_number"].transform(
+        "size"
     )
-    df = df.merge(split_las, how="left")
 
     df[split_cols] = df[split_cols].divide(df["split"], axis=0)
 
@@ -343,33 +458,88 @@ def charities_by_la(data):
 
 CC_BY_AREA = DataAsset(
     name="Charities by area",
-    inputs={"CC": CC_MAIN, "CC_Area": CC_AREA, "ltla_utla": LTLA_UTLA},
+    inputs={
+        "register": CC_REGISTER,
+        "ltla_utla": LTLA_UTLA,
+        "families": CC_FAMILIES,
+        "postcodes": postcodes.POSTCODES,
+    },
     processer=charities_by_la,
     description=("Where charity has UTLA or region info."),
+    cpu_bound=True,
+)
+
+
+def build_charity_search(data):
+    cc = data["cc"]
+    area = data["cc_area"].dropna(subset=["organisation_number", "utla_code"])
+    utlas = area.groupby("organisation_number")["utla_code"].agg(sorted)
+    index = search.update_index(
+        cc.assign(utla_code=cc["organisation_number"].map(utlas)),
+        key="organisation_number",
+        text_cols=["charity_name", "charity_activities"],
+        field_cols=["utla_code", "charity_registration_status"],
+        name_col="charity_name",
+    )
+    return index
+
+
+def search_vocabulary(data):
+    return data["index"].vocabulary()
+
+
+# the index itself is the artifact, so a search works from a published
+# version without SEARCH_DIR having been built on this machine
+CC_SEARCH_INDEX = DataAsset(
+    name="Charity search postings",
+    inputs={"cc": CC_MAIN, "cc_area": CC_BY_AREA},
+    processer=build_charity_search,
+    cpu_bound=True,
+)
+
+CC_SEARCH = DataAsset(
+    name="Charity search index",
+    inputs={"index": CC_SEARCH_INDEX},
+    processer=search_vocabulary,
+    description="Words in charity names and activities, searched with main.py search",
 )
 
 
 def n_charities_by_la(data):
     df = data["cc"]
-    df = df[["utla_code", "utla_name", "organisation_number", "latest_expenditure"]]
+    by = ["utla_code", "utla_name"]
+    # counts and spend by UTLA and family, updated from the charities whose
+    # rows changed since the last version of CC_BY_AREA
+    totals = changes.incremental_totals(
+        "Charities by UTLA",
+        df.dropna(subset=["organisation_number"]),
+        key="organisation_number",
+        by=by + ["family_id"],
+        sums=["latest_expenditure"],
+    ).reset_index()
+    counts = totals.groupby(by).agg(
+        count=("rows", "sum"), total_spent=("latest_expenditure", "sum")
+    )
+    # linked charities count once, as their family
+    counts["families"] = totals.groupby(by)["family_id"].nunique()
+
+    # UTLAs with no charities are kept, with no counts
+    groups = pd.MultiIndex.from_frame(df[by].dropna().drop_duplicates())
     df = (
-        df.groupby(["utla_code", "utla_name"])
-        .agg({"organisation_number": "count", "latest_expenditure": "sum"})
-        .rename(
-            columns={
-                "organisation_number": "count",
-                "latest_expenditure": "total_spent",
-            }
-        )
+        counts.reindex(groups)
+        .fillna(0)
+        .astype({"count": "int64", "families": "int64"})
         .sort_values("total_spent", ascending=False)
         .reset_index()
     )
 
-    df = df[["utla_code", "utla_name", "count", "total_spent"]]
+    df = df[["utla_code", "utla_name", "count", "families", "total_spent"]]
     codes_not_in_set = data["cc"].loc[
         data["cc"]["organisation_number"].isnull(), "utla_code"
     ]
-    df.loc[df["utla_code"].isin(codes_not_in_set), ["count", "total_spent"]] = np.nan
+    df.loc[
+        df["utla_code"].isin(codes_not_in_set), ["count", "families", "total_spent"]
+    ] = np.nan
 
     return df
 
@@ -448,6 +618,7 @@ def charity_spend_by_lvlup_strip(data):
         on="utla_code",
     )
     import plotly.express as px
+    import seaborn as sns
 
     pal = sns.color_palette("magma_r").as_hex()
     pal = [pal[1], pal[3], pal[5]]
@@ -539,22 +710,65 @@ CharitySpendLvlupHex = DataAsset(
 )
 
 
+def charity_area_index(area):
+    """
+    Positions for UTLA x charity matrices of CC_BY_AREA rows: the UTLAs, each
+    row's UTLA, the charities (sorted organisation_numbers) and each row's
+    charity
+    """
+    area_cols = ["utla_code", "utla_name"]
+    area_idx = area.groupby(area_cols, dropna=False, sort=False).ngroup()
+    areas = area[area_cols].groupby(area_idx).first()
+    charities, charity_idx = np.unique(area["organisation_number"], return_inverse=True)
+    return areas, area_idx.to_numpy(), charities, charity_idx
+
+
+def area_matrix(index, values):
+    areas, area_idx, charities, charity_idx = index
+    return sparse.csr_matrix(
+        (values, (area_idx, charity_idx)), shape=(len(areas), len(charities))
+    )
+
+
 def combine_cc_history(data):
-    area = data["cc_area"]
+    """
+    Expenditure by UTLA and year. A sparse UTLA x charity matrix of 1 / split
+    weights times a charity x year expenditure matrix gives the totals
+    directly, without building a row per charity, year and area.
+    """
+    area = data["cc_area"].dropna(subset=["organisation_number"])
     df = data["cc_history"]
 
-    # area = area[['organisation_number', 'split', 'utla_name']]
-    df = df[["organisation_number", "ar_cycle_reference", "total_gross_expenditure"]]
-    df = df.merge(area).sort_values(["split", "organisation_number"])
-    df["total_gross_expenditure"] = df["total_gross_expenditure"].divide(
-        df["split"], axis=0
+    index = charity_area_index(area)
+    areas, _, charities, _ = index
+    weights = area_matrix(index, 1 / area["split"].to_numpy())
+    df = df[df["organisation_number"].isin(charities)]
+    year = 2000 + pd.to_numeric(df["ar_cycle_reference"].str[2:], errors="coerce")
+    if year.isnull().any():
+        # factorize gives these -1, which isn't a valid matrix column
+        logging.warning(f"Dropping {year.isnull().sum()} returns with no cycle year")
+        df, year = df[year.notnull()], year.dropna()
+    history_idx = np.searchsorted(charities, df["organisation_number"])
+    year_idx, years = pd.factorize(year.astype("int64"), sort=True)
+    spend = sparse.csr_matrix(
+        (
+            df["total_gross_expenditure"].fillna(0).to_numpy(),
+            (history_idx, year_idx),
+        ),
+        shape=(len(charities), len(years)),
     )
-    df["year"] = 2000 + pd.to_numeric(df["ar_cycle_reference"].str[2:])
-    df = df.drop(
-        columns=["split", "latest_expenditure", "latest_income", "ar_cycle_reference"]
+    returns = sparse.csr_matrix(
+        (np.ones(len(df)), (history_idx, year_idx)), shape=spend.shape
     )
 
-    return df
+    totals = (weights @ spend).toarray()
+    # only area/years with a return, as the row-level merge gave
+    present = ((weights > 0).astype(float) @ returns).toarray() > 0
+    area_pos, year_pos = np.nonzero(present)
+    result = areas.iloc[area_pos].reset_index(drop=True)
+    result["year"] = years[year_pos]
+    result["total_gross_expenditure"] = totals[area_pos, year_pos]
+    return result
 
 
 CC_HISTORY_AREA = DataAsset(
@@ -564,6 +778,67 @@ CC_HISTORY_AREA = DataAsset(
 )
 
 
+def categories_by_area(data):
+    """
+    Charities and their spending by classification and UTLA. A sparse charity
+    x category matrix multiplied by the UTLA x charity matrices gives every
+    category and area at once.
+    """
+    area = data["cc_area"].dropna(subset=["organisation_number"])
+    cat = data["cc_cat"]
+    pop = data["ltla_pop"]
+    lkp = data["ltla_utla"]
+
+    index = charity_area_index(area)
+    areas, _, charities, _ = index
+    operating = (area_matrix(index, np.ones(len(area))) > 0).astype(float)
+    # latest_expenditure is already split over each charity's areas
+    spend = area_matrix(index, area["latest_expenditure"].fillna(0).to_numpy())
+
+    cat = cat[cat["organisation_number"].isin(charities)]
+    cat_idx, codes = pd.factorize(cat["classification_code"], sort=True)
+    member = sparse.csr_matrix(
+        (
+            np.ones(len(cat)),
+            (np.searchsorted(charities, cat["organisation_number"]), cat_idx),
+        ),
+        shape=(len(charities), len(codes)),
+    )
+    member.data[:] = 1
+
+    counts = (operating @ member).tocoo()
+    spent = (spend @ member).tocsr()
+    df = areas.iloc[counts.row].reset_index(drop=True)
+    df["classification_code"] = codes[counts.col]
+    df["count"] = counts.data.astype(int)
+    df["total_spent"] = np.asarray(spent[counts.row, counts.col]).ravel()
+
+    descriptions = cat.drop_duplicates("classification_code").set_index(
+        "classification_code"
+    )[["classification_type", "classification_description"]]
+    df = df.merge(descriptions, left_on="classification_code", right_index=True)
+
+    utla_pop = (
+        pd.merge(pop, lkp[["la_code", "utla_code"]], on="la_code")
+        .groupby("utla_code")["population"]
+        .sum()
+    )
+    df["spent_per_head"] = df["total_spent"] / df["utla_code"].map(utla_pop)
+    return df
+
+
+CC_CATEGORY_AREA = DataAsset(
+    name="Charities and spending by category and UTLA",
+    inputs={
+        "cc_cat": CC_CATEGORY,
+        "cc_area": CC_BY_AREA,
+        "ltla_pop": POP_LA,
+        "ltla_utla": LTLA_UTLA,
+    },
+    processer=categories_by_area,
+)
+
+
 def level_up_spend_history(data):
     pop = data["ltla_pop"]
     lkp = data["ltla_utla"]
@@ -608,6 +883,7 @@ LVL_UP_AREA_HISTORY = DataAsset(
 def level_up_spend_history_chart(data):
     import plotly.express as px
     import plotly.graph_objects as go
+    import seaborn as sns
 
     pal = sns.color_palette("magma_r").as_hex()
     pal = [pal[5], pal[3], pal[1]]
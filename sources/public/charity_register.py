@@ -0,0 +1,181 @@
+"""
+Charity Commission tables held column-wise and sorted by organisation_number.
+
+The CC tables are joined on organisation_number over and over. Keys are kept
+as sorted int32 arrays, so lookups are a binary search, and membership of a
+table is a bitmap indexed by organisation_number. Filters across tables, like
+active charities that made a part A return, are then ANDs of bitmaps rather
+than hash merges.
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+import changes
+from utils import to_pickle_atomic
+
+KEY = "organisation_number"
+FAMILY_LINKS = [
+    "organisation_number",
+    "registered_charity_number",
+    "linked_charity_number",
+]
+
+
+def org_numbers(keys):
+    return np.asarray(keys, dtype="float64").astype("int32")
+
+
+def key_bitmap(keys, size):
+    bitmap = np.zeros(size, dtype=bool)
+    bitmap[org_numbers(keys)] = True
+    return bitmap
+
+
+def in_bitmap(bitmap, keys):
+    """Whether each key is set in bitmap; missing keys are not"""
+    keys = np.asarray(keys, dtype="float64")
+    valid = (keys >= 0) & (keys < len(bitmap))  # False for NaN
+    inside = np.zeros(len(keys), dtype=bool)
+    inside[valid] = bitmap[keys[valid].astype("int32")]
+    return inside
+
+
+class CharityTable:
+    """One CC table as columns sorted by organisation_number"""
+
+    def __init__(self, df):
+        df = df[df[KEY].notnull()]
+        keys = org_numbers(df[KEY])
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.columns = {
+            col: df[col].to_numpy()[order] for col in df.columns if col != KEY
+        }
+
+    def __len__(self):
+        return len(self.keys)
+
+    def positions(self, keys):
+        """Row of the first match for each key, and whether there is one"""
+        keys = np.asarray(keys, dtype="float64")
+        pos = np.searchsorted(self.keys, keys)
+        found = pos < len(self.keys)
+        found[found] = self.keys[pos[found]] == keys[found]
+        return pos, found
+
+    def lookup(self, keys, column):
+        """column for each key, from its first row, NaN where there is none"""
+        pos, found = self.positions(keys)
+        values = pd.Series(self.columns[column][np.minimum(pos, len(self) - 1)])
+        return values.where(found).to_numpy()
+
+    def to_frame(self):
+        return pd.DataFrame({KEY: self.keys, **self.columns})
+
+
+class CharityRegister:
+    """
+    The CC tables by name (e.g. main, area, grantmakers from part A), with
+    bitmaps of the organisation_numbers in each to filter
+    and join on.
+    """
+
+    def __init__(self, **tables):
+        self.tables = {name: CharityTable(df) for name, df in tables.items()}
+        self.size = 1 + max(
+            (int(t.keys[-1]) for t in self.tables.values() if len(t)), default=0
+        )
+
+    def bitmap(self, name, where=None):
+        """organisation_numbers in a table, or in the rows where(columns) selects"""
+        table = self.tables[name]
+        keys = table.keys if where is None else table.keys[where(table.columns)]
+        return key_bitmap(keys, self.size)
+
+    def semi_join(self, df, bitmap):
+        """Rows of df whose organisation_number is in bitmap"""
+        return df[in_bitmap(bitmap, df[KEY])]
+
+    def anti_join(self, df, bitmap):
+        """Rows of df whose organisation_number isn't in bitmap"""
+        return df[~in_bitmap(bitmap, df[KEY])]
+
+    def lookup(self, name, keys, column):
+        return self.tables[name].lookup(keys, column)
+
+
+def union_find(labels, a, b):
+    """
+    Join the nodes of each edge a[i]-b[i] into components, vectorized over all
+    edges at once. labels holds each node's component as its smallest node
+    (np.arange for unjoined nodes) and is updated in place.
+    """
+    a, b = np.asarray(a), np.asarray(b)
+    while True:
+        la, lb = labels[a], labels[b]
+        differ = la != lb
+        if not differ.any():
+            return labels
+        low = np.minimum(la[differ], lb[differ])
+        # hook each root onto the smallest root it is joined to
+        np.minimum.at(labels, la[differ], low)
+        np.minimum.at(labels, lb[differ], low)
+        # pointer jumping until every node points at its root
+        while True:
+            roots = labels[labels]
+            if (roots == labels).all():
+                break
+            labels[:] = roots
+
+
+def family_edges(df):
+    """
+    Edges from each linked charity (linked_charity_number other than 0) to its
+    main charity, the one with the same registered_charity_number and a
+    linked_charity_number of 0. Linked charities whose main charity isn't in
+    df are joined to the first of them instead.
+    """
+    linked = df[df["linked_charity_number"] != 0]
+    mains = (
+        df[df["linked_charity_number"] == 0]
+        .drop_duplicates("registered_charity_number")
+        .set_index("registered_charity_number")[KEY]
+    )
+    main = linked["registered_charity_number"].map(mains)
+    first = linked.groupby("registered_charity_number")[KEY].transform("min")
+    return org_numbers(linked[KEY]), org_numbers(main.fillna(first))
+
+
+def charity_families(df):
+    """
+    family_id for each charity in df: the smallest organisation_number of the
+    charities it is joined to by (organisation_number, linked_charity_number)
+    links, see family_edges. Families are kept between extracts and only new
+    links are joined, unless charities were removed or relinked.
+    """
+    df = df[FAMILY_LINKS].dropna()
+    # the links and their labels are kept in one file so they stay in step
+    path = os.path.join(changes.state_dir("charity families"), "families.pkl")
+    size = int(df[KEY].max()) + 1 if len(df) else 0
+
+    delta = None
+    if os.path.exists(path):
+        links, labels = pd.read_pickle(path)
+        delta = changes.diff(links, df, KEY)
+
+    if delta is not None and len(delta.updated) + len(delta.removed) == 0:
+        if len(labels) < size:
+            labels = np.r_[labels, np.arange(len(labels), size, dtype="int32")]
+        if len(delta.inserted):
+            logging.info(f"Linking {len(delta.inserted)} new charities into families")
+            regno = delta.inserted["registered_charity_number"]
+            a, b = family_edges(df[df["registered_charity_number"].isin(regno)])
+            labels = union_find(labels, a, b)
+    else:
+        labels = union_find(np.arange(size, dtype="int32"), *family_edges(df))
+
+    to_pickle_atomic((df, labels), path)
+    return pd.Series(labels[org_numbers(df[KEY])], index=df.index, name="family_id")
@@ -88,6 +88,7 @@ def combine_lkps(data):
 LTLA_UTLA = DataSource(
     name="LTLA to UTLA",
     data_getter=get_ltla_utla_lookup,
+    probe=utils.FileProbe(os.path.join(utils.RESOURCE_DIR, LTLA_UTLA_FILE["fname"])),
     org=Organisations.ons,
     sub_org="GeoPortal",
     source_type=SourceType.public_download,
@@ -98,6 +99,7 @@ LTLA_UTLA = DataSource(
 LTLA_REGION = DataSource(
     name="LTLA to Region",
     data_getter=get_ltla_region_lookup,
+    probe=utils.FileProbe(os.path.join(utils.RESOURCE_DIR, LTLA_REGION_FILE["fname"])),
     org=Organisations.ons,
     sub_org="GeoPortal",
     source_type=SourceType.public_download,
@@ -108,6 +110,7 @@ LTLA_REGION = DataSource(
 LTLA_COUNTRY = DataSource(
     name="LTLA to Country",
     data_getter=get_ltla_country_lookup,
+    probe=utils.FileProbe(os.path.join(utils.RESOURCE_DIR, LTLA_COUNTRY_FILE["fname"])),
     org=Organisations.ons,
     sub_org="GeoPortal",
     source_type=SourceType.public_download,
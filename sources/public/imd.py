@@ -1,40 +1,206 @@
-import os
+import logging
+from functools import partial
 
+import numpy as np
 import pandas as pd
+from scipy import sparse
 
 import utils
+from excel import Workbook
 from models import DataAsset, DataDate, DataSource, DateMeta, Organisations, SourceType
+from sources.public.geoportal import LKP
 
 IMD_PUBLISH_URL = (
     "https://www.gov.uk/government/statistics/english-indices-of-deprivation-2019"
 )
 IMD_LA_URL = "https://assets.publishing.service.gov.uk/government/uploads/system/uploads/attachment_data/file/833995/File_10_-_IoD2019_Local_Authority_District_Summaries__lower-tier__.xlsx"
 
+IMD_LSOA_URL = "https://assets.publishing.service.gov.uk/government/uploads/system/uploads/attachment_data/file/845345/File_7_-_All_IoD2019_Scores__Ranks__Deciles_and_Population_Denominators_3.csv"
+
+IMD_LA_WORKBOOK = Workbook(IMD_LA_URL, sheet_name="IMD", module=__name__)
+
 IMD_COL_MAP = {
     "Local Authority District code (2019)": "la_code",
     "Local Authority District name (2019)": "la_name",
 }
 
 
+IMD_LSOA_COL_MAP = {
+    "LSOA code (2011)": "lsoa_code",
+    "Local Authority District code (2019)": "la_code",
+    "Total population: mid 2015 (excluding prisoners)": "population",
+}
+
+IMD_DOMAINS = {
+    "Index of Multiple Deprivation (IMD) Score": "imd",
+    "Income Score (rate)": "income",
+    "Employment Score (rate)": "employment",
+    "Education, Skills and Training Score": "education",
+    "Health Deprivation and Disability Score": "health",
+    "Crime Score": "crime",
+    "Barriers to Housing and Services Score": "housing",
+    "Living Environment Score": "environment",
+}
+
+IMD_DATE_META = dict(
+    publish_date=pd.to_datetime("2019-01-01"),
+    update_freq=pd.Timedelta(365 * 5, unit="days"),  # website says update due in 2023
+)
+
+
+class LsoaScores:
+    """
+    IMD domain scores by LSOA held as arrays: LSOA codes, an index into the
+    LA codes for each LSOA, populations and an LSOA x domain score matrix.
+    """
+
+    def __init__(self, lsoa_code, la_codes, la_index, population, scores, domains):
+        self.lsoa_code = lsoa_code
+        self.la_codes = la_codes
+        self.la_index = la_index
+        self.population = population
+        self.scores = scores
+        self.domains = domains
+
+    @classmethod
+    def from_frame(cls, df):
+        la = pd.Categorical(df["la_code"])
+        domains = list(IMD_DOMAINS.values())
+        return cls(
+            lsoa_code=df["lsoa_code"].to_numpy(dtype="U9"),
+            la_codes=np.asarray(la.categories, dtype="U9"),
+            la_index=la.codes.astype("int32"),
+            population=df["population"].to_numpy(dtype="float64"),
+            scores=df[domains].to_numpy(dtype="float64"),
+            domains=np.asarray(domains),
+        )
+
+    def to_frame(self):
+        df = pd.DataFrame(self.scores, columns=self.domains)
+        df.insert(0, "lsoa_code", self.lsoa_code)
+        df.insert(1, "la_code", self.la_codes[self.la_index])
+        df.insert(2, "population", self.population)
+        return df
+
+    def membership(self, mapping, on="la_code"):
+        """
+        Sparse group x LSOA matrix of population weights, for mapping: a
+        Series from la_code (or lsoa_code) to group. LSOAs with no group are
+        left out.
+        """
+        if on == "la_code":
+            group = pd.Categorical(mapping.reindex(self.la_codes))
+            lsoa_group = group.codes[self.la_index]
+        else:
+            group = pd.Categorical(mapping.reindex(self.lsoa_code))
+            lsoa_group = group.codes
+        keep = lsoa_group >= 0
+        if not keep.all():
+            logging.warning(f"IMD rollup: {(~keep).sum()} LSOAs have no group")
+        matrix = sparse.csr_matrix(
+            (
+                self.population[keep],
+                (lsoa_group[keep], np.flatnonzero(keep)),
+            ),
+            shape=(len(group.categories), len(self.lsoa_code)),
+        )
+        return matrix, group.categories
+
+    def rollup(self, mapping, on="la_code"):
+        """Population weighted mean of each domain score by group"""
+        matrix, groups = self.membership(mapping, on)
+        weights = np.asarray(matrix.sum(axis=1)).ravel()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scores = (matrix @ self.scores) / weights[:, None]
+        df = pd.DataFrame(scores, columns=self.domains, index=groups)
+        df["population"] = weights
+        return df
+
+
+def read_imd_lsoa():
+    df = pd.read_csv(IMD_LSOA_URL, usecols=list(IMD_LSOA_COL_MAP) + list(IMD_DOMAINS))
+    df = df.rename(columns={**IMD_LSOA_COL_MAP, **IMD_DOMAINS})
+    return DataDate(df, DateMeta(**IMD_DATE_META))
+
+
+def lsoa_scores(data):
+    # IoD2019 uses 2019 LAD codes, so LSOAs of since merged LAs join LKP and
+    # POP_LA through their current codes
+    df = data["lsoa"]
+    return LsoaScores.from_frame(
+        df.assign(la_code=utils.current_la_codes(df["la_code"]))
+    )
+
+
+def rollup_scores(data, code_col, name_col=None, on="la_code"):
+    """
+    IMD scores rolled up to the groups in data["grouping"], which maps its on
+    column (la_code or lsoa_code) to code_col and, if given, name_col. With
+    no grouping each LA is its own group.
+    """
+    scores = data["scores"]
+    grouping = data.get("grouping")
+    if grouping is None:
+        mapping = pd.Series(scores.la_codes, index=scores.la_codes)
+    else:
+        grouping = grouping.drop_duplicates(on)
+        mapping = grouping.set_index(on, drop=False)[code_col]
+    df = scores.rollup(mapping, on).rename_axis(code_col).reset_index()
+    if name_col is not None:
+        names = grouping.drop_duplicates(code_col).set_index(code_col)[name_col]
+        df.insert(1, name_col, df[code_col].map(names))
+    return df
+
+
+def imd_rollup(name, code_col, name_col=None, grouping=None, on="la_code"):
+    """DataAsset of IMD scores by a custom grouping, see rollup_scores"""
+    inputs = {"scores": IMD_LSOA_SCORES}
+    if grouping is not None:
+        inputs["grouping"] = grouping
+    return DataAsset(
+        name=name,
+        inputs=inputs,
+        processer=partial(rollup_scores, code_col=code_col, name_col=name_col, on=on),
+    )
+
+
 def read_imd_la():
-    df = pd.read_excel(IMD_LA_URL, sheet_name="IMD")
+    df = IMD_LA_WORKBOOK.read()
     df = df.rename(columns=IMD_COL_MAP)
 
-    dateMeta = DateMeta(
-        publish_date=pd.to_datetime("2019-01-01"),
-        update_freq=pd.Timedelta(
-            365 * 5, unit="days"
-        ),  # website says update due in 2023
-    )
-    return DataDate(df, dateMeta)
+    return DataDate(df, DateMeta(**IMD_DATE_META))
 
 
 IMD_LA = DataSource(
     name="Top level IMD indicators by LA",
     data_getter=read_imd_la,
+    probe=utils.UrlProbe(IMD_LA_URL),
     org=Organisations.mhclg,
     sub_org="English indices of deprivation 2019",
     source_type=SourceType.webscrape,
     url=IMD_PUBLISH_URL,
     instructions="MHCLG website indicates indices are due to be updated in 2023",
 )
+
+IMD_LSOA = DataSource(
+    name="IMD domain scores by LSOA",
+    data_getter=read_imd_lsoa,
+    probe=utils.UrlProbe(IMD_LSOA_URL),
+    org=Organisations.mhclg,
+    sub_org="English indices of deprivation 2019",
+    source_type=SourceType.public_download,
+    url=IMD_PUBLISH_URL,
+    instructions="MHCLG website indicates indices are due to be updated in 2023",
+)
+
+IMD_LSOA_SCORES = DataAsset(
+    name="IMD domain score arrays by LSOA",
+    inputs={"lsoa": IMD_LSOA},
+    processer=lsoa_scores,
+)
+
+IMD_LTLA = imd_rollup("IMD domain scores by LTLA", "la_code")
+
+IMD_UTLA = imd_rollup(
+    "IMD domain scores by UTLA", "utla_code", "utla_name", grouping=LKP
+)
@@ -1,18 +1,25 @@
 import pandas as pd
 
+from excel import Workbook
 from models import DataAsset, DataDate, DataSource, DateMeta, Organisations, SourceType
 from plotting import hex
 from sources.public.geoportal import LKP
-from utils import YEAR
+from utils import YEAR, UrlProbe
 
 LEVELLING_UP_AREAS = {
     "url": "https://assets.publishing.service.gov.uk/government/uploads/system/uploads/attachment_data/file/1062538/Levelling_Up_Fund_round_2_-_list_of_local_authorites_by_priority_category.xlsx",
     "publish_date": pd.to_datetime("2022-03-22"),
 }
+LEVELLING_UP_WORKBOOK = Workbook(
+    LEVELLING_UP_AREAS["url"],
+    sheet_name=0,
+    usecols=["Local authority ", "Category"],
+    module=__name__,
+)
 
 
 def read_levelling_up_areas():
-    df = pd.read_excel(LEVELLING_UP_AREAS["url"], sheet_name=0)
+    df = LEVELLING_UP_WORKBOOK.read()
     df = df.rename(columns={"Local authority ": "la_name"})
     df["la_name"] = df["la_name"].str.replace(
         "Rhondda Cynon Taf", " Rhondda Cynon Taff"
@@ -54,6 +61,7 @@ def levelling_up_utla_map(data):
 LEVELLING_UP = DataSource(
     name="Levelling up priority categories",
     data_getter=read_levelling_up_areas,
+    probe=UrlProbe(LEVELLING_UP_AREAS["url"]),
     org=Organisations.dluhc,
     source_type=SourceType.webscrape,
     url="https://www.gov.uk/government/publications/levelling-up-fund-round-2-updates-to-the-index-of-priority-places",
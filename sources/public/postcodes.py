@@ -0,0 +1,72 @@
+"""
+Postcode to LSOA and LA lookup, sorted by normalised postcode.
+
+The ONS postcode lookup has a row for each of ~2.6 million postcodes. It is
+read once into a frame of normalised 7 byte postcodes, sorted, with the LSOA
+and LA codes as categoricals, and published as the POSTCODES source. A batch
+of postcodes is then assigned codes with one binary search. The file isn't
+shipped, so POSTCODES is optional: without it get_data returns None.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import utils
+from models import DataDate, DataSource, DateMeta, Organisations, SourceType
+
+POSTCODE_FILE = os.path.join(utils.DATA_DIR, "PCD_OA_LSOA_MSOA_LAD_MAY22_UK_LU.csv")
+POSTCODE_COLS = {"pcds": "postcode", "lsoa11cd": "lsoa_code", "ladcd": "la_code"}
+CODE_COLS = ["lsoa_code", "la_code"]
+
+
+def normalise(postcodes):
+    """Upper case postcodes without spaces or punctuation, as 7 byte strings"""
+    postcodes = pd.Series(postcodes, dtype="object").fillna("").astype(str)
+    postcodes = postcodes.str.upper().str.replace(r"[^A-Z0-9]", "", regex=True)
+    return postcodes.to_numpy(dtype="S7")
+
+
+def get_postcodes(path=POSTCODE_FILE):
+    df = pd.read_csv(
+        path, usecols=list(POSTCODE_COLS), dtype=str, encoding="latin-1"
+    ).rename(columns=POSTCODE_COLS)
+    df["postcode"] = normalise(df["postcode"]).astype(str)
+    df = df.sort_values("postcode", kind="stable", ignore_index=True)
+    df[CODE_COLS] = df[CODE_COLS].astype("category")
+    return DataDate(df, DateMeta())
+
+
+def lookup(postcodes, table):
+    """
+    Frame of postcode, lsoa_code and la_code for each of postcodes, in
+    order, with NaN codes where a postcode isn't in table (from POSTCODES)
+    """
+    index = postcodes.index if isinstance(postcodes, pd.Series) else None
+    df = pd.DataFrame({"postcode": postcodes}, index=index)
+    for col in CODE_COLS:
+        df[col] = pd.Series(np.nan, index=df.index, dtype="object")
+    if len(table) == 0:
+        return df
+
+    sorted_postcodes = table["postcode"].to_numpy(dtype="S7")
+    keys = normalise(df["postcode"])
+    pos = np.searchsorted(sorted_postcodes, keys)
+    pos = np.minimum(pos, len(sorted_postcodes) - 1)
+    found = (sorted_postcodes[pos] == keys) & (keys != b"")
+    for col in CODE_COLS:
+        df.loc[found, col] = table[col].to_numpy()[pos[found]]
+    return df
+
+
+POSTCODES = DataSource(
+    name="Postcode to LSOA and LA",
+    data_getter=get_postcodes,
+    probe=utils.FileProbe(POSTCODE_FILE),
+    org=Organisations.ons,
+    sub_org="GeoPortal",
+    source_type=SourceType.public_download,
+    url="https://geoportal.statistics.gov.uk/datasets/ons::postcode-to-output-area-to-lower-layer-super-output-area-to-middle-layer-super-output-area-to-local-authority-district-may-2022-lookup-in-the-uk/about",
+    dateMeta=DateMeta(update_freq=utils.YEAR),
+    optional=True,
+)
@@ -0,0 +1,116 @@
+"""
+Assign lon/lat points to the areas of a geography level.
+
+Boundaries named by plotting.hex.GEOGRAPHY are read from resources/ once and
+cached as WKB, keyed on the file hash, so later loads skip parsing GeoJSON.
+Points are matched in one STRtree query over prepared polygons.
+"""
+import functools
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import shapely
+
+import utils
+from plotting.hex import GEOGRAPHY
+
+SPATIAL_DIR = os.path.join(utils.CACHE_DIR, "spatial")
+
+
+def boundary_path(level):
+    return os.path.join(utils.RESOURCE_DIR, GEOGRAPHY[level].boundry_file)
+
+
+def boundary_token(level):
+    """Hash of the level's boundary file, which must have been downloaded"""
+    path = boundary_path(level)
+    token = utils.FileProbe(path)()
+    if token is None:
+        raise FileNotFoundError(f"{level} boundaries not found, download {path}")
+    return token
+
+
+def read_geojson(path):
+    """codes, names and geometries of the features in a GeoJSON file"""
+    with open(path) as f:
+        features = json.load(f)["features"]
+    properties = features[0]["properties"]
+    code_col = next(col for col in properties if col.endswith("CD"))
+    name_col = code_col[:-2] + "NM"
+    return (
+        np.array([f["properties"][code_col] for f in features]),
+        np.array([f["properties"].get(name_col, "") for f in features]),
+        shapely.from_geojson([json.dumps(f["geometry"]) for f in features]),
+    )
+
+
+class Boundaries:
+    def __init__(self, codes, names, geometries):
+        self.codes = codes
+        self.names = names
+        self.geometries = geometries
+        shapely.prepare(self.geometries)
+        self.tree = shapely.STRtree(self.geometries)
+
+    @classmethod
+    def load(cls, level):
+        path = boundary_path(level)
+        token = boundary_token(level)
+        cache = os.path.join(SPATIAL_DIR, f"{level}-{token[:16]}.npz")
+        if os.path.exists(cache):
+            with np.load(cache) as arrays:
+                wkb = np.split(arrays["wkb"], arrays["offsets"][1:-1])
+                return cls(
+                    arrays["codes"],
+                    arrays["names"],
+                    shapely.from_wkb([part.tobytes() for part in wkb]),
+                )
+
+        logging.info(f"Indexing {path}")
+        codes, names, geometries = read_geojson(path)
+        wkb = shapely.to_wkb(geometries)
+        offsets = np.zeros(len(wkb) + 1, dtype="int64")
+        np.cumsum([len(b) for b in wkb], out=offsets[1:])
+        with utils.atomic_write(cache) as f:
+            np.savez(
+                f,
+                codes=codes,
+                names=names,
+                wkb=np.frombuffer(b"".join(wkb), dtype="uint8"),
+                offsets=offsets,
+            )
+        return cls(codes, names, geometries)
+
+    def assign(self, lon, lat):
+        """Position of the area containing each point, -1 where none does"""
+        points = shapely.points(np.asarray(lon, float), np.asarray(lat, float))
+        point_idx, area_idx = self.tree.query(points, predicate="intersects")
+        areas = np.full(len(points), -1)
+        # points on a shared border match both areas, keep the first
+        areas[point_idx[::-1]] = area_idx[::-1]
+        return areas
+
+
+@functools.lru_cache
+def boundaries(level):
+    return Boundaries.load(level)
+
+
+def assign_points(lon, lat, level):
+    """
+    Frame of the code and name of the level's area containing each lon/lat
+    point (WGS84), NaN for points outside every area
+    """
+    G = GEOGRAPHY[level]
+    b = boundaries(level)
+    areas = b.assign(lon, lat)
+    inside = areas >= 0
+    codes = np.full(len(areas), np.nan, dtype="object")
+    names = codes.copy()
+    codes[inside] = b.codes[areas[inside]]
+    names[inside] = b.names[areas[inside]]
+    index = lon.index if isinstance(lon, pd.Series) else None
+    return pd.DataFrame({G.code_col: codes, G.name_col: names}, index=index)
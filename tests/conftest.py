@@ -0,0 +1,50 @@
+import json
+import os
+
+import pytest
+
+from artifacts import ARTIFACTS, DirectoryBackend
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Run each test in an empty directory, with resources/ and its own artifact store"""
+    os.symlink(os.path.join(REPO, "resources"), tmp_path / "resources")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ARTIFACTS, "backend", DirectoryBackend(str(tmp_path / "store")))
+    return tmp_path
+
+
+def square(x, y):
+    return {
+        "type": "Polygon",
+        "coordinates": [[[x, y], [x + 1, y], [x + 1, y + 1], [x, y + 1], [x, y]]],
+    }
+
+
+def write_boundaries(path, squares):
+    features = [
+        {
+            "type": "Feature",
+            "properties": {"LAD22CD": code, "LAD22NM": name},
+            "geometry": square(*corner),
+        }
+        for code, name, corner in squares
+    ]
+    with open(path, "w") as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f)
+
+
+@pytest.fixture
+def boundary_file(monkeypatch):
+    """Two unit squares side by side as the boundaries of every level"""
+    import spatial
+
+    path = os.path.abspath("boundaries.json")
+    write_boundaries(path, [("E1", "West", (0, 0)), ("E2", "East", (1, 0))])
+    monkeypatch.setattr(spatial, "boundary_path", lambda level: path)
+    spatial.boundaries.cache_clear()
+    yield path
+    spatial.boundaries.cache_clear()
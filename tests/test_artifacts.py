@@ -0,0 +1,78 @@
+import time
+
+import pandas as pd
+
+import registry
+from artifacts import ArtifactStore, DirectoryBackend, backend_from_spec
+from models import DataAsset, DataDate, DataSource, DateMeta, SourceType
+
+
+def test_publish_and_fetch(tmp_path):
+    store = ArtifactStore(DirectoryBackend(str(tmp_path)), max_age=60)
+    digest = store.publish("key", {"a": 1})
+    assert store.fetch("key") == {"a": 1}
+    assert store.ref("key")["digest"] == digest
+    # identical objects share one stored object
+    assert store.publish("other", {"a": 1}) == digest
+    assert store.fetch("missing") is None
+
+
+def test_old_artifacts_are_not_served(tmp_path):
+    store = ArtifactStore(DirectoryBackend(str(tmp_path)), max_age=60)
+    store.publish("key", 1)
+    time.sleep(0.01)
+    assert store.fetch("key", max_age=0) is None
+    assert store.fetch("key") == 1
+
+
+def test_prune_keeps_referenced_objects(tmp_path):
+    store = ArtifactStore(DirectoryBackend(str(tmp_path)))
+    store.publish("key", 1)
+    store.publish("key", 2)
+    assert store.prune() == 1
+    assert store.fetch("key") == 2
+
+
+def test_stale_artifact_is_served_then_refreshed(tmp_path):
+    store = ArtifactStore(DirectoryBackend(str(tmp_path)), max_age=0)
+    store.publish("key", "old")
+    refreshed = []
+    obj = store.get_or_build(
+        "key", lambda: "new", stale_window=60, on_refresh=refreshed.append
+    )
+    assert obj == "old"
+    store.refreshing["key"].join()
+    assert refreshed == ["new"]
+    assert store.fetch("key", max_age=60) == "new"
+
+
+def test_backend_from_spec(tmp_path):
+    assert backend_from_spec(f"file://{tmp_path}").root == str(tmp_path)
+    assert backend_from_spec(str(tmp_path)).root == str(tmp_path)
+
+
+def test_asset_key_follows_code_and_sources(monkeypatch):
+    source = DataSource(
+        name="source",
+        source_type=SourceType.api,
+        data_getter=lambda: DataDate(pd.DataFrame({"x": [1]}), DateMeta()),
+    )
+    asset = DataAsset("asset", inputs={"s": source}, processer=lambda d: d["s"])
+    # no key until the source has a published version
+    assert asset.artifact_key() is None
+    source.get_data()
+    key = asset.artifact_key()
+    assert key.startswith("asset-")
+    monkeypatch.setattr(registry, "code_hash", lambda: "edited")
+    assert asset.artifact_key() != key
+
+
+def test_code_hash_covers_every_module(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, "ROOT", str(tmp_path))
+    (tmp_path / "plotting").mkdir()
+    hashes = set()
+    for path in ["models.py", "plotting/hex.py", "models.py"]:
+        with open(tmp_path / path, "a") as f:
+            f.write("# edit\n")
+        hashes.add(registry.code_hash.__wrapped__())
+    assert len(hashes) == 3
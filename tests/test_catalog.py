@@ -0,0 +1,48 @@
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+import catalog
+from models import DateMeta
+
+
+def test_records_versions_of_a_source():
+    df = pd.DataFrame({"a": [1, 2], "b": ["x", "y"]})
+    meta = DateMeta(publish_date=pd.Timestamp("2023-01-01"))
+    catalog.record("source", df, meta, "hash1", byte_size=10, probe="p1")
+    catalog.record("source", df.head(1), meta, "hash2")
+    catalog.record("other", df, DateMeta(), "hash3")
+
+    latest = catalog.latest_versions()
+    assert latest["source"]["content_hash"] == "hash2"
+    assert latest["source"]["row_count"] == 1
+    assert latest["source"]["publish_date"].startswith("2023-01-01")
+    assert json.loads(latest["other"]["schema"]) == {
+        "a": str(df["a"].dtype),
+        "b": str(df["b"].dtype),
+    }
+    assert [v["content_hash"] for v in catalog.versions("source")] == [
+        "hash1",
+        "hash2",
+    ]
+
+
+def test_reloading_a_version_marks_it_latest_and_keeps_its_probe():
+    df = pd.DataFrame({"a": [1]})
+    catalog.record("source", df, DateMeta(), "hash1", probe="p1")
+    catalog.record("source", df, DateMeta(), "hash2")
+    catalog.record("source", df, DateMeta(), "hash1")
+    latest = catalog.latest_versions()["source"]
+    assert (latest["content_hash"], latest["probe"]) == ("hash1", "p1")
+    assert len(catalog.versions("source")) == 2
+
+
+def test_catalogs_without_a_probe_column_are_migrated():
+    os.makedirs(os.path.dirname(catalog.CATALOG_PATH), exist_ok=True)
+    con = sqlite3.connect(catalog.CATALOG_PATH)
+    con.execute(catalog.SCHEMA.replace("probe TEXT,", ""))
+    con.close()
+    catalog.record("source", pd.DataFrame({"a": [1]}), DateMeta(), "h", probe="p")
+    assert catalog.latest_versions()["source"]["probe"] == "p"
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from sources.public import charity_comission as cc
+
+
+def test_categories_by_area_match_a_row_level_join():
+    area = pd.DataFrame(
+        {
+            "organisation_number": [1, 1, 2, 3, None],
+            "utla_code": ["U1", "U2", "U1", "U2", "U3"],
+            "utla_name": ["One", "Two", "One", "Two", "Three"],
+            "latest_expenditure": [5.0, 5.0, 20.0, None, None],
+        }
+    )
+    cat = pd.DataFrame(
+        {
+            "organisation_number": [1, 1, 2, 3, 3, 9],
+            "classification_code": [101, 205, 101, 205, 205, 101],
+            "classification_type": ["What", "Who", "What", "Who", "Who", "What"],
+            "classification_description": ["Ed", "Kids", "Ed", "Kids", "Kids", "Ed"],
+        }
+    )
+    pop = pd.DataFrame({"la_code": ["L1", "L2"], "population": [100, 50]})
+    lkp = pd.DataFrame({"la_code": ["L1", "L2"], "utla_code": ["U1", "U2"]})
+
+    df = cc.categories_by_area(
+        {"cc_area": area, "cc_cat": cat, "ltla_pop": pop, "ltla_utla": lkp}
+    )
+    df = df.set_index(["utla_code", "classification_code"]).sort_index()
+
+    expected = (
+        area.dropna(subset=["organisation_number"])
+        .merge(cat.drop_duplicates(["organisation_number", "classification_code"]))
+        .groupby(["utla_code", "classification_code"])
+        .agg(
+            count=("organisation_number", "nunique"),
+            total_spent=("latest_expenditure", "sum"),
+        )
+    )
+    pd.testing.assert_frame_equal(
+        df[["count", "total_spent"]], expected, check_dtype=False
+    )
+    assert df.loc[("U1", 101), "spent_per_head"] == 25 / 100
+    assert df.loc[("U2", 205), "classification_description"] == "Kids"
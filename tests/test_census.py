@@ -0,0 +1,88 @@
+import pandas as pd
+
+from sources.public import census
+
+
+def ts009_chunks():
+    rows = [
+        ("E1", "A", 1, "Female", 0, 10),
+        ("E1", "A", 2, "Male", 0, 5),
+        ("E1", "A", 1, "Female", 7, 2),
+        ("E2", "B", 2, "Male", 90, 4),
+    ]
+    df = pd.DataFrame(
+        rows,
+        columns=[
+            "Lower tier local authorities Code",
+            "Lower tier local authorities",
+            "Sex (2 categories) Code",
+            "Sex (2 categories)",
+            "Age (101 categories) Code",
+            "Observation",
+        ],
+    )
+    return [df.iloc[:2], df.iloc[2:]]
+
+
+def test_age_sex_columns():
+    assert census.age_sex_columns("Lower tier local authorities Code") == "la_code"
+    assert census.age_sex_columns("Sex (2 categories)") == "sex"
+    assert census.age_sex_columns("Sex (2 categories) Code") is None
+    assert census.age_sex_columns("Age (101 categories) Code") == "age"
+    assert census.age_sex_columns("Age (101 categories)") is None
+
+
+def test_streamed_chunks_sum_to_every_grain():
+    # as stream_ons_csv reads them, without the unused columns
+    chunks = [
+        c[[col for col in c.columns if census.age_sex_columns(col)]]
+        for c in ts009_chunks()
+    ]
+    totals = census.aggregate_age_sex(chunks)
+
+    la = totals["la"].set_index("la_code")["population"]
+    assert la.to_dict() == {"E1": 17, "E2": 4}
+    sex = totals["sex"].set_index(["la_code", "sex"])["population"]
+    assert sex[("E1", "Female")] == 12
+    bands = totals["age_band"].set_index(["la_code", "age_band"])["population"]
+    assert bands[("E1", "0-4")] == 15
+    assert bands[("E1", "5-9")] == 2
+    assert bands[("E2", "85+")] == 4
+    assert totals["age"]["population"].sum() == 21
+
+
+def test_census_tables_are_spread_by_la(monkeypatch):
+    tables = {
+        "TS1": pd.DataFrame(
+            {
+                "la_code": ["E1", "E1", "E2"],
+                "la_name": ["A", "A", "B"],
+                "group": ["x", "y", "x"],
+                "Observation": [1, 2, 3],
+            }
+        ),
+        "TS2": pd.DataFrame(
+            {
+                "la_code": ["E1", "E2"],
+                "la_name": ["A", "B"],
+                "kind": ["z", "z"],
+                "Observation": [4, 5],
+            }
+        ),
+    }
+    dates = {"TS1": "2023-01-01T00:00:00Z", "TS2": "2023-02-01T00:00:00Z"}
+    monkeypatch.setattr(
+        census,
+        "get_ons_table",
+        lambda id: (tables[id], {"release_date": dates[id]}),
+    )
+
+    dataDate = census.get_census_tables({"TS1": "group", "TS2": "kind"})
+    df = dataDate.df.set_index("la_code")
+    assert list(df.columns) == ["la_name", "TS1: x", "TS1: y", "TS2: z"]
+    assert pd.isnull(df.loc["E2", "TS1: y"])
+    assert df.loc["E1", "TS2: z"] == 4
+    assert dataDate.dateMeta.publish_date == pd.Timestamp("2023-02-01")
+
+    single = census.get_census_tables({"TS2": "kind"}).df
+    assert list(single.columns) == ["la_code", "la_name", "z"]
@@ -0,0 +1,95 @@
+import pandas as pd
+
+import changes
+from sources.public import charity_comission as cc
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=["id", "name", "spend"])
+
+
+def test_diff_by_key():
+    old = frame([(1, "a", 10), (2, "b", 20), (3, "c", 30)])
+    new = frame([(3, "c", 30), (2, "b", 25), (4, "d", 40)])
+    delta = changes.diff(old, new, "id")
+    assert delta.inserted["id"].tolist() == [4]
+    assert delta.updated["spend"].tolist() == [25]
+    assert delta.previous["spend"].tolist() == [20]
+    assert delta.removed["id"].tolist() == [1]
+    assert len(delta) == 3
+
+
+def test_row_order_is_not_a_change():
+    old = frame([(1, "a", 10), (1, "a2", 11), (2, "b", 20)])
+    assert len(changes.diff(old, old.iloc[::-1], "id")) == 0
+
+
+def test_capture_diffs_each_new_version():
+    v1 = frame([(1, "a", 10), (2, "b", 20)])
+    v2 = frame([(1, "a", 15), (2, "b", 20)])
+    assert changes.capture("source", v1, "id", "v1") is None
+    # the same version loaded again is not a change
+    assert changes.capture("source", v1, "id", "v1") is None
+    delta = changes.capture("source", v2, "id", "v2")
+    assert delta.updated["spend"].tolist() == [15]
+    assert changes.read_state("source") == {"version": "v2", "previous": "v1"}
+
+
+def test_incremental_totals_match_a_full_regroup():
+    v1 = frame([(1, "a", 10), (1, "b", 5), (2, "b", 20), (3, "d", 30)])
+    # 1 moves a row, 2 is updated, 3 removed and 4 inserted
+    v2 = frame([(1, "a", 10), (1, "c", 5), (2, "b", 25), (4, "a", 40)])
+    changes.incremental_totals("totals", v1, "id", ["name"], ["spend"])
+    totals = changes.incremental_totals("totals", v2, "id", ["name"], ["spend"])
+    pd.testing.assert_frame_equal(
+        totals, changes.group_totals(v2, ["name"], ["spend"]), check_dtype=False
+    )
+    # d has no rows left, so its group is dropped rather than kept at zero
+    assert totals["rows"].to_dict() == {"a": 2, "b": 1, "c": 1}
+    assert totals["spend"].to_dict() == {"a": 50, "b": 25, "c": 5}
+    # an unchanged version returns the kept totals
+    again = changes.incremental_totals("totals", v2, "id", ["name"], ["spend"])
+    pd.testing.assert_frame_equal(again, totals)
+
+
+def by_area(rows):
+    return pd.DataFrame(
+        rows,
+        columns=[
+            "organisation_number",
+            "utla_code",
+            "utla_name",
+            "latest_expenditure",
+            "family_id",
+        ],
+    )
+
+
+def test_charity_counts_update_like_a_full_recompute(monkeypatch, tmp_path):
+    v1 = by_area(
+        [
+            (1, "U1", "One", 10.0, 1),
+            (2, "U1", "One", 20.0, 1),
+            (3, "U2", "Two", 30.0, 3),
+            (4, None, "Unmatched", 5.0, 4),
+            (None, "U3", "Three", None, None),
+        ]
+    )
+    v2 = by_area(
+        [
+            (1, "U1", "One", 15.0, 1),
+            (3, "U1", "One", 15.0, 3),
+            (3, "U2", "Two", 15.0, 3),
+            (5, "U2", "Two", 50.0, 5),
+            (None, "U3", "Three", None, None),
+        ]
+    )
+    cc.n_charities_by_la({"cc": v1})
+    updated = cc.n_charities_by_la({"cc": v2})
+    monkeypatch.setattr(changes, "CHANGES_DIR", str(tmp_path / "fresh"))
+    full = cc.n_charities_by_la({"cc": v2})
+    pd.testing.assert_frame_equal(updated, full)
+    df = updated.set_index("utla_code")
+    assert df.loc["U1", ["count", "families", "total_spent"]].tolist() == [2, 2, 30]
+    assert df.loc["U2", "count"] == 2
+    assert df.loc["U3"].drop("utla_name").isnull().all()
@@ -0,0 +1,29 @@
+import pandas as pd
+
+from sources.public import charity_comission as cc
+
+
+def test_unparseable_cycle_years_are_dropped():
+    area = pd.DataFrame(
+        {
+            "organisation_number": [1, 2, 2],
+            "utla_code": ["U1", "U1", "U2"],
+            "utla_name": ["One", "One", "Two"],
+            "split": [1, 2, 2],
+        }
+    )
+    history = pd.DataFrame(
+        {
+            "organisation_number": [1, 2, 2, 1, 3],
+            "ar_cycle_reference": ["AR20", "AR20", "AR21", "ARxx", "AR20"],
+            "total_gross_expenditure": [10.0, 40.0, 8.0, 99.0, 5.0],
+        }
+    )
+    df = cc.combine_cc_history({"cc_history": history, "cc_area": area})
+    totals = df.set_index(["utla_code", "year"])["total_gross_expenditure"]
+    assert totals.to_dict() == {
+        ("U1", 2020): 30.0,
+        ("U1", 2021): 4.0,
+        ("U2", 2020): 20.0,
+        ("U2", 2021): 4.0,
+    }
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+from fingerprint import fingerprint
+from sources.public import charity_comission as cc
+from sources.public.charity_register import CharityRegister, CharityTable
+
+MAIN = pd.DataFrame(
+    {
+        "organisation_number": [3, 1, 2, 4],
+        "registered_charity_number": [30, 10, 10, 40],
+        "linked_charity_number": [0, 0, 1, 0],
+        "charity_name": ["c", "a", "b", "d"],
+        "charity_registration_status": [
+            "Registered",
+            "Registered",
+            "Removed",
+            "Registered",
+        ],
+        "charity_reporting_status": ["Submission Received"] * 3 + ["Overdue"],
+        "charity_insolvent": [False, False, False, False],
+        "charity_in_administration": [False, True, False, False],
+        "latest_income": [1.0, 2.0, 3.0, 4.0],
+        "latest_expenditure": [1.0, 2.0, 3.0, 4.0],
+    }
+)
+GRANTMAKERS = pd.DataFrame({"organisation_number": [1, 3, 4]})
+
+
+def make_register():
+    return cc.build_charity_register({"main": MAIN, "grantmakers": GRANTMAKERS})
+
+
+def test_table_lookup_is_by_organisation_number():
+    table = CharityTable(MAIN)
+    assert table.keys.tolist() == [1, 2, 3, 4]
+    names = table.lookup([4, 9, np.nan, 1], "charity_name")
+    assert names[0] == "d" and names[3] == "a"
+    assert pd.isnull(names[1]) and pd.isnull(names[2])
+
+
+def test_bitmap_joins():
+    register = make_register()
+    df = pd.DataFrame({"organisation_number": [1, 2, np.nan, 7]})
+    grantmakers = register.bitmap("grantmakers")
+    assert register.semi_join(df, grantmakers)["organisation_number"].tolist() == [1]
+    assert len(register.anti_join(df, grantmakers)) == 3
+    assert cc.remove_grantmakers(MAIN, register)["organisation_number"].tolist() == [
+        3,
+        1,
+        4,
+    ]
+
+
+def test_active_charities_from_the_register():
+    df = cc.filter_active_charities({"register": make_register()})
+    assert df["organisation_number"].tolist() == [3]
+    assert list(df.columns) == [
+        "organisation_number",
+        "registered_charity_number",
+        "linked_charity_number",
+        "charity_name",
+        "latest_income",
+        "latest_expenditure",
+    ]
+
+
+def test_registers_fingerprint_on_their_tables():
+    assert fingerprint(make_register()) == fingerprint(make_register())
+    other = CharityRegister(main=MAIN.assign(latest_income=0.0))
+    assert fingerprint(other) != fingerprint(CharityRegister(main=MAIN))
+
+
+def test_active_charities_follow_any_status_change():
+    main = pd.concat([MAIN.iloc[[0]]] * 5000, ignore_index=True)
+    main["organisation_number"] = np.arange(1, 5001)
+    register = cc.build_charity_register({"main": main, "grantmakers": GRANTMAKERS})
+    assert len(cc.filter_active_charities({"register": register})) == 5000
+    # a change to a row a sampled fingerprint would skip
+    main.loc[1234, "charity_registration_status"] = "Removed"
+    register = cc.build_charity_register({"main": main, "grantmakers": GRANTMAKERS})
+    assert len(cc.filter_active_charities({"register": register})) == 4999
+
+
+def test_register_leaves_out_history_and_classification():
+    assert set(cc.CC_REGISTER.inputs) == {"main", "area", "grantmakers"}
@@ -0,0 +1,58 @@
+import os
+
+import pandas as pd
+import plotly.graph_objects as go
+import pytest
+import shapely.geometry
+
+from conftest import write_boundaries
+from plotting import choropleth
+
+
+def test_simplified_boundaries_are_keyed_by_code(boundary_file):
+    geojson = choropleth.simplified_geojson("LTLA")
+    features = geojson["features"]
+    assert [f["properties"] for f in features] == [
+        {"code": "E1", "name": "West"},
+        {"code": "E2", "name": "East"},
+    ]
+    west, east = [shapely.geometry.shape(f["geometry"]) for f in features]
+    # simplified as a coverage, so the shared border is still shared
+    assert west.intersection(east).length > 0.99
+    assert west.intersection(east).area == 0
+
+
+def test_simplified_boundaries_are_cached(boundary_file, monkeypatch):
+    first = choropleth.simplified_geojson("LTLA", zoom="local")
+    assert len(os.listdir(choropleth.CHOROPLETH_DIR)) == 1
+
+    def fail(*args):
+        raise AssertionError("simplified again")
+
+    monkeypatch.setattr(choropleth.shapely, "coverage_simplify", fail)
+    assert choropleth.simplified_geojson("LTLA", zoom="local") == first
+
+
+def test_cache_follows_the_boundary_file(boundary_file):
+    choropleth.simplified_geojson("LTLA")
+    write_boundaries(boundary_file, [("E3", "North", (0, 1))])
+    choropleth.spatial.boundaries.cache_clear()
+    geojson = choropleth.simplified_geojson("LTLA")
+    assert [f["properties"]["code"] for f in geojson["features"]] == ["E3"]
+    assert len(os.listdir(choropleth.CHOROPLETH_DIR)) == 2
+
+
+def test_plot_choropleth(boundary_file):
+    df = pd.DataFrame({"la_code": ["E1"], "la_name": ["West"], "value": [3.0]})
+    fig = choropleth.plot_choropleth(df, "LTLA", "value", highlight=df["la_code"])
+    assert isinstance(fig, go.Figure)
+    valid, null, highlight = fig.data
+    assert list(valid.locations) == ["E1"]
+    # areas without a value are drawn grey
+    assert list(null.locations) == ["E2"]
+    assert list(highlight.locations) == ["E1"]
+
+
+def test_missing_boundary_file_is_named():
+    with pytest.raises(FileNotFoundError, match="Counties_and_Unitary"):
+        choropleth.simplified_geojson("UTLA")
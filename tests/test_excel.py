@@ -0,0 +1,46 @@
+import os
+
+import pandas as pd
+import pytest
+
+import excel
+import registry
+from models import DataDate, DataSource, DateMeta, SourceType
+from utils import FileProbe, atomic_write, to_pickle_atomic
+
+
+def test_workbook_reads_only_its_columns(tmp_path):
+    path = str(tmp_path / "book.xlsx")
+    pd.DataFrame({"a": [1, 2], "b": ["x", "y"], "c": [0.5, 1.5]}).to_excel(
+        path, index=False
+    )
+    workbook = excel.Workbook(path, usecols=["a", "c"], module=__name__)
+    excel.WORKBOOKS.remove(workbook)
+    assert workbook.module == __name__
+    assert list(workbook.read().columns) == ["a", "c"]
+
+
+def test_convert_skips_missing_partner_files(tmp_path, monkeypatch):
+    path = tmp_path / "partner.csv"
+    source = DataSource(
+        name="partner",
+        source_type=SourceType.email,
+        data_getter=lambda: DataDate(pd.read_csv(path), DateMeta()),
+        probe=FileProbe(str(path)),
+    )
+    monkeypatch.setattr(registry, "resolve", lambda name: source)
+    assert excel.convert("partner") is None
+
+    path.write_text("x\n1\n")
+    assert excel.convert("partner") == source.artifact_key
+
+
+def test_atomic_write_leaves_nothing_on_failure(tmp_path):
+    path = str(tmp_path / "out" / "out.pkl")
+    to_pickle_atomic({"a": 1}, path)
+    with pytest.raises(RuntimeError):
+        with atomic_write(path) as f:
+            f.write(b"partial")
+            raise RuntimeError
+    assert pd.read_pickle(path) == {"a": 1}
+    assert os.listdir(tmp_path / "out") == ["out.pkl"]
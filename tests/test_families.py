@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import changes
+from sources.public import charity_comission as cc
+from sources.public.charity_register import charity_families, union_find
+
+CHARITIES = pd.DataFrame(
+    {
+        # 10 is a main charity with linked 11 and 12, 20 stands alone, 30 and
+        # 31 are linked charities whose main charity has been removed
+        "organisation_number": [10, 11, 12, 20, 30, 31],
+        "registered_charity_number": [1, 1, 1, 2, 3, 3],
+        "linked_charity_number": [0, 1, 2, 0, 1, 2],
+        "latest_expenditure": [100.0, 5.0, np.nan, 50.0, 7.0, 8.0],
+    }
+)
+
+
+def test_union_find_joins_chains():
+    labels = np.arange(6, dtype="int32")
+    result = union_find(labels, [5, 4, 1], [4, 3, 0])
+    assert result.tolist() == [0, 0, 2, 3, 3, 3]
+    # updated in place, as documented
+    assert labels.tolist() == [0, 0, 2, 3, 3, 3]
+
+
+def test_families_follow_linked_charity_numbers():
+    families = charity_families(CHARITIES)
+    assert families.tolist() == [10, 10, 10, 20, 30, 30]
+
+
+def test_new_links_join_existing_families():
+    charity_families(CHARITIES)
+    new = pd.DataFrame(
+        {
+            "organisation_number": [13, 21],
+            "registered_charity_number": [1, 2],
+            "linked_charity_number": [3, 1],
+            "latest_expenditure": [0.0, 0.0],
+        }
+    )
+    families = charity_families(pd.concat([CHARITIES, new], ignore_index=True))
+    assert families.tolist()[-2:] == [10, 20]
+
+
+def test_family_spend_counts_once():
+    df = cc.link_charity_families({"cc": CHARITIES}).set_index("organisation_number")
+    # main charities' accounts cover their linked charities
+    assert df["counts_spend"].to_dict() == {
+        10: True,
+        11: False,
+        12: False,
+        20: True,
+        30: True,
+        31: True,
+    }
+
+
+def test_links_and_labels_are_kept_together():
+    charity_families(CHARITIES)
+    directory = changes.state_dir("charity families")
+    assert os.listdir(directory) == ["families.pkl"]
+    links, labels = pd.read_pickle(os.path.join(directory, "families.pkl"))
+    assert len(links) == len(CHARITIES)
+    assert labels[31] == 30
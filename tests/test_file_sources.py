@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+import utils
+from artifacts import ARTIFACTS
+from models import DataAsset, DataDate, DataSource, DateMeta, SourceType
+from utils import FileProbe, UrlProbe
+
+
+def make_source(path):
+    return DataSource(
+        name="partner file",
+        source_type=SourceType.email,
+        data_getter=lambda: DataDate(pd.read_csv(path), DateMeta()),
+        probe=FileProbe(str(path)),
+    )
+
+
+def test_missing_partner_file_marks_source_unavailable(tmp_path):
+    path = tmp_path / "partner.csv"
+    source = make_source(path)
+    asset = DataAsset("asset", inputs={"s": source}, processer=lambda d: d["s"])
+    assert not source.available
+    assert source.artifact_key is None
+    assert asset.artifact_key() is None
+    with pytest.raises(FileNotFoundError):
+        source.get_data()
+
+
+def test_changed_file_is_a_new_key(tmp_path):
+    path = tmp_path / "partner.csv"
+    path.write_text("x\n1\n")
+    source = make_source(path)
+    assert source.available
+    key = source.artifact_key
+    assert source.get_data()["x"].tolist() == [1]
+
+    path.write_text("x\n2\n")
+    assert source.artifact_key != key
+    assert source.reload()["x"].tolist() == [2]
+
+
+def test_url_sources_are_keyed_on_their_headers(monkeypatch):
+    headers = {"token": '"v1"|Mon, 01 Jan 2024'}
+    monkeypatch.setattr(utils, "url_probe", lambda url: headers["token"])
+    builds = []
+
+    def getter():
+        builds.append(headers["token"])
+        return DataDate(pd.DataFrame({"x": [len(builds)]}), DateMeta())
+
+    def make():
+        return DataSource(
+            name="workbook",
+            source_type=SourceType.public_download,
+            data_getter=getter,
+            probe=UrlProbe("https://example.com/workbook.xlsx", ttl=0),
+        )
+
+    source = make()
+    key = source.artifact_key
+    assert "/" not in key and " " not in key
+    source.get_data()
+    asset = DataAsset("asset", inputs={"s": source}, processer=lambda d: d["s"])
+    # the same url version is never downloaded again, however old
+    monkeypatch.setattr(ARTIFACTS, "max_age", 0)
+    assert make().get_data()["x"].tolist() == [1]
+    assert asset.artifact_key() is not None
+
+    headers["token"] = '"v2"|Tue, 02 Jan 2024'
+    assert source.artifact_key != key
+    assert make().get_data()["x"].tolist() == [2]
+
+
+def test_url_probe_reuses_headers_within_ttl(monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, "url_probe", lambda url: calls.append(url) or "t")
+    probe = UrlProbe("https://example.com/file.csv", ttl=60)
+    assert probe() == probe() == "t"
+    assert len(calls) == 1
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from fingerprint import FingerprintCache, fingerprint, tag_version
+
+
+def test_memoize_hits_for_equal_frames(tmp_path):
+    cache = FingerprintCache(str(tmp_path / "cache"))
+    calls = []
+
+    @cache.memoize(name="total")
+    def total(data):
+        calls.append(1)
+        return data["df"]["x"].sum()
+
+    df = pd.DataFrame({"x": np.arange(5000)})
+    assert total({"df": df}) == total({"df": df.copy()})
+    assert len(calls) == 1
+    assert cache.stats()["functions"]["total"] == {"hits": 1, "misses": 1}
+
+
+def test_changed_frame_is_a_miss(tmp_path):
+    cache = FingerprintCache(str(tmp_path / "cache"))
+
+    @cache.memoize(name="total")
+    def total(df):
+        return df["x"].sum()
+
+    df = pd.DataFrame({"x": np.arange(10)})
+    assert total(df) == 45
+    # small frames are hashed in full
+    assert total(df.assign(x=df["x"] + 1)) == 55
+
+
+def test_version_invalidates(tmp_path):
+    cache = FingerprintCache(str(tmp_path / "cache"))
+    df = pd.DataFrame({"x": [1, 2]})
+
+    @cache.memoize(name="f", version="1")
+    def f(df):
+        return 1
+
+    @cache.memoize(name="f", version="2")
+    def g(df):
+        return 2
+
+    assert (f(df), g(df)) == (1, 2)
+
+
+def test_columns_added_in_place_change_the_fingerprint():
+    df = pd.DataFrame({"x": [1, 2, 3]})
+    before = fingerprint(df)
+    df["y"] = 1
+    assert fingerprint(df) != before
+
+
+def test_tagged_frames_are_keyed_on_their_version():
+    a = pd.DataFrame({"x": [1, 2, 3]})
+    b = pd.DataFrame({"x": [4, 5, 6]})
+    tag_version(a, "source@2023-01-01")
+    tag_version(b, "source@2023-01-01")
+    assert fingerprint(a) == fingerprint(b)
+    assert fingerprint(a) != fingerprint(pd.DataFrame({"x": [1, 2, 3]}))
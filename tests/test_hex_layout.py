@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from plotting import hex_layout
+from plotting.hex import GEOGRAPHY
+
+# a 4 x 3 block of areas of about 1km2, a little off a regular grid
+COLUMN = np.tile(np.arange(4), 3)
+ROW = np.repeat(np.arange(3), 4)
+LON = COLUMN * 0.015 + 0.001 * ROW
+LAT = ROW * 0.009 + 54
+AREA = np.full(12, 1e6)
+
+
+def test_areas_get_distinct_cells():
+    df = hex_layout.hex_layout(LON, LAT, AREA)
+    assert len(df) == 12
+    assert not df.duplicated(["xi", "yi"]).any()
+
+
+def test_cells_start_at_zero_and_keep_row_offsets():
+    df = hex_layout.hex_layout(LON, LAT, AREA)
+    assert df["xi"].min() == 0
+    assert df["yi"].min() in (0, 1)
+    # odd rows are shifted half a cell left, as in the hex files
+    spacing = (df["grid_y"].max() - df["grid_y"].min()) / (
+        hex_layout.ROW_HEIGHT * (df["yi"].max() - df["yi"].min())
+    )
+    shift = df["grid_x"] / spacing + 0.5 * (df["yi"] % 2) - df["xi"]
+    assert np.allclose(shift, shift.iloc[0])
+
+
+def test_layout_keeps_neighbours_close():
+    df = hex_layout.hex_layout(LON, LAT, AREA)
+    # west to east and south to north are kept
+    assert (df.groupby(ROW)["yi"].mean().diff().dropna() > 0).all()
+    assert (df.groupby(COLUMN)["xi"].mean().diff().dropna() > 0).all()
+
+
+def test_hex_file_columns():
+    assert hex_layout.hex_file_columns("LTLA") == ("LAD22CD", "LAD22NM")
+    assert hex_layout.hex_file_columns("UTLA") == ("CTYUA22CD", "CTYUA22NM")
+    assert hex_layout.hex_file_columns("region") == ("region_code", "region_name")
+
+
+def test_written_hexes_read_back(monkeypatch):
+    centroids = pd.DataFrame(
+        {
+            "la_code": [f"E{i}" for i in range(12)],
+            "la_name": [f"LA {i}" for i in range(12)],
+            "LONG": LON,
+            "LAT": LAT,
+            "area": AREA,
+        }
+    )
+    monkeypatch.setattr(hex_layout, "centroids", lambda geography: centroids)
+    hex_layout.write_hexes("LTLA", path="hexes.csv")
+    G = GEOGRAPHY["LTLA"]
+    df = pd.read_csv("hexes.csv").rename(columns=G.rename_col_map)
+    assert df[G.code_col].tolist() == centroids["la_code"].tolist()
+    assert {"LAD22NM", "xi", "yi", "grid_x", "grid_y"} <= set(df.columns)
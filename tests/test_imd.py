@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+import utils
+from sources.public import imd
+
+
+def lsoa_frame():
+    df = pd.DataFrame(
+        {
+            "lsoa_code": ["L1", "L2", "L3", "L4"],
+            "la_code": ["A", "A", "B", "C"],
+            "population": [100.0, 300.0, 200.0, 50.0],
+        }
+    )
+    for i, domain in enumerate(imd.IMD_DOMAINS.values()):
+        df[domain] = [10.0 + i, 20.0 + i, 30.0 + i, 40.0 + i]
+    return df
+
+
+def test_scores_round_trip_to_a_frame():
+    df = lsoa_frame()
+    scores = imd.lsoa_scores({"lsoa": df})
+    pd.testing.assert_frame_equal(scores.to_frame(), df, check_dtype=False)
+
+
+def test_rollup_is_population_weighted():
+    scores = imd.lsoa_scores({"lsoa": lsoa_frame()})
+    grouping = pd.DataFrame(
+        {
+            "la_code": ["A", "B", "C"],
+            "utla_code": ["U1", "U1", "U2"],
+            "utla_name": ["One", "One", "Two"],
+        }
+    )
+    df = imd.rollup_scores(
+        {"scores": scores, "grouping": grouping}, "utla_code", "utla_name"
+    ).set_index("utla_code")
+    assert df.loc["U1", "utla_name"] == "One"
+    assert df.loc["U1", "population"] == 600
+    assert np.isclose(df.loc["U1", "imd"], (100 * 10 + 300 * 20 + 200 * 30) / 600)
+    assert df.loc["U2", "imd"] == 40
+
+
+def test_each_la_is_its_own_group_without_a_grouping():
+    scores = imd.lsoa_scores({"lsoa": lsoa_frame()})
+    df = imd.rollup_scores({"scores": scores}, "la_code").set_index("la_code")
+    assert df["population"].to_dict() == {"A": 400, "B": 200, "C": 50}
+    assert df.loc["A", "imd"] == 17.5
+
+
+def test_lsoa_groupings_leave_out_unmapped_lsoas():
+    scores = imd.lsoa_scores({"lsoa": lsoa_frame()})
+    grouping = pd.DataFrame({"lsoa_code": ["L2", "L3"], "ward": ["W", "W"]})
+    df = imd.rollup_scores(
+        {"scores": scores, "grouping": grouping}, "ward", on="lsoa_code"
+    )
+    assert df["population"].tolist() == [500]
+    assert df["imd"].tolist() == [(300 * 20 + 200 * 30) / 500]
+
+
+def test_rollups_share_the_score_arrays():
+    assert imd.IMD_UTLA.inputs["scores"] is imd.IMD_LSOA_SCORES
+    assert imd.IMD_LTLA.inputs["scores"] is imd.IMD_LSOA_SCORES
+
+
+def test_merged_las_survive_the_rollup():
+    df = lsoa_frame()
+    df["la_code"] = ["E07000004", "E07000007", "E07000150", "E08000035"]
+    scores = imd.lsoa_scores({"lsoa": df})
+    assert scores.la_codes.tolist() == ["E06000060", "E06000061", "E08000035"]
+    grouping = pd.DataFrame(
+        {
+            "la_code": ["E06000060", "E06000061", "E08000035"],
+            "utla_code": ["E06000060", "E06000061", "E08000035"],
+            "utla_name": ["Buckinghamshire", "North Northamptonshire", "Leeds"],
+        }
+    )
+    df = imd.rollup_scores(
+        {"scores": scores, "grouping": grouping}, "utla_code", "utla_name"
+    ).set_index("utla_name")
+    assert df.loc["Buckinghamshire", "population"] == 400
+    assert df.loc["Buckinghamshire", "imd"] == 17.5
+
+
+def test_current_codes_are_the_ones_in_the_lookup():
+    la_codes = set(imd.LKP.get_data()["la_code"])
+    for new, olds in utils.LA_CODE_CHANGES.items():
+        assert new in la_codes
+        assert not la_codes & set(olds)
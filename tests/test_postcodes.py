@@ -0,0 +1,129 @@
+import pandas as pd
+
+from models import DataAsset, DataDate, DataSource, DateMeta, SourceType
+from sources.public import charity_comission as cc
+from sources.public import postcodes
+from utils import FileProbe
+
+LOOKUP = pd.DataFrame(
+    {
+        "pcds": ["SW1A 1AA", "M1 1AE", "LS1 4AP"],
+        "oa11cd": ["x", "y", "z"],
+        "lsoa11cd": ["E01000001", "E01000002", "E01000003"],
+        "ladcd": ["E09000033", "E08000003", "E08000035"],
+    }
+)
+
+
+def postcode_table():
+    LOOKUP.to_csv("postcodes.csv", index=False)
+    return postcodes.get_postcodes("postcodes.csv").df
+
+
+def test_lookup_normalises_postcodes():
+    found = postcodes.lookup(
+        pd.Series(["m1 1ae", "LS1-4AP", "ZZ9 9ZZ", None, ""], index=[5, 6, 7, 8, 9]),
+        postcode_table(),
+    )
+    assert found.index.tolist() == [5, 6, 7, 8, 9]
+    assert found["la_code"].tolist()[:2] == ["E08000003", "E08000035"]
+    assert found["lsoa_code"][5] == "E01000002"
+    assert found["la_code"][7:].isnull().all()
+
+
+def test_lookup_with_empty_table():
+    found = postcodes.lookup(["M1 1AE"], postcode_table().iloc[:0])
+    assert found["la_code"].isnull().all()
+
+
+def area_inputs(table):
+    main = pd.DataFrame(
+        {
+            "organisation_number": [1, 2, 3],
+            "registered_charity_number": [10, 20, 30],
+            "linked_charity_number": [0, 0, 0],
+            "charity_name": ["a", "b", "c"],
+            "charity_registration_status": ["Registered"] * 3,
+            "charity_reporting_status": ["Submission Received"] * 3,
+            "charity_insolvent": [False] * 3,
+            "charity_in_administration": [False] * 3,
+            "latest_income": [10.0, 20.0, 30.0],
+            "latest_expenditure": [10.0, 20.0, 30.0],
+            "charity_contact_postcode": ["LS1 4AP", "M1 1AE", "ZZ9 9ZZ"],
+        }
+    )
+    # 1 has an area of operation, 2 and 3 have none
+    area = pd.DataFrame(
+        {
+            "organisation_number": [1],
+            "registered_charity_number": [10],
+            "linked_charity_number": [0],
+            "geographic_area_type": ["Local Authority"],
+            "geographic_area_description": ["Leeds"],
+        }
+    )
+    register = cc.build_charity_register(
+        {
+            "main": main,
+            "area": area,
+            "grantmakers": pd.DataFrame({"organisation_number": [1, 2, 3]}),
+        }
+    )
+    ltla_utla = pd.DataFrame(
+        {
+            "la_code": ["E08000035", "E08000003"],
+            "la_name": ["Leeds", "Manchester"],
+            "utla_code": ["E08000035", "E08000003"],
+            "utla_name": ["Leeds", "Manchester"],
+        }
+    )
+    return {
+        "register": register,
+        "ltla_utla": ltla_utla,
+        "families": cc.link_charity_families({"cc": main}),
+        "postcodes": table,
+    }
+
+
+def test_charities_without_areas_fall_back_to_their_postcode():
+    df = cc.charities_by_la(area_inputs(postcode_table()))
+    df = df.set_index("organisation_number")
+    # 3's postcode isn't in the lookup, so it has no area
+    assert df.loc[1, "utla_code"] == "E08000035"
+    assert not df.loc[1, "area_from_postcode"]
+    assert df.loc[2, "utla_code"] == "E08000003"
+    assert df.loc[2, "area_from_postcode"]
+    assert 3 not in df.index
+
+
+def test_charities_by_area_without_the_postcode_file():
+    df = cc.charities_by_la(area_inputs(None))
+    assert df["organisation_number"].dropna().tolist() == [1]
+
+
+def test_missing_optional_source_is_skipped():
+    lookup = DataSource(
+        name="lookup",
+        source_type=SourceType.public_download,
+        data_getter=lambda: postcodes.get_postcodes("postcodes.csv"),
+        probe=FileProbe("postcodes.csv"),
+        optional=True,
+    )
+    other = DataSource(
+        name="other",
+        source_type=SourceType.api,
+        data_getter=lambda: DataDate(pd.DataFrame({"x": [1]}), DateMeta()),
+    )
+    asset = DataAsset(
+        "asset",
+        inputs={"lookup": lookup, "other": other},
+        processer=lambda d: pd.DataFrame({"rows": [0 if d["lookup"] is None else 3]}),
+    )
+    assert asset.get_data()["rows"].tolist() == [0]
+    without = asset.artifact_key()
+    assert without is not None
+
+    # the asset is built again once the file turns up
+    postcode_table()
+    assert asset.get_data()["rows"].tolist() == [3]
+    assert asset.artifact_key() != without
@@ -0,0 +1,64 @@
+import pandas as pd
+
+import catalog
+import rebuild
+import registry
+from models import DataDate, DataSource, DateMeta, SourceType
+
+
+def make_source(token, calls):
+    def getter():
+        calls.append(token[0])
+        return DataDate(pd.DataFrame({"token": [token[0]]}), DateMeta())
+
+    return DataSource(
+        name="source",
+        source_type=SourceType.api,
+        data_getter=getter,
+        probe=lambda: token[0] if token[0] != "none" else None,
+    )
+
+
+def test_uncatalogued_source_is_changed_without_fetching():
+    calls = []
+    assert rebuild.source_changed(make_source(["a"], calls), None)
+    assert calls == []
+
+
+def test_probe_decides_whether_to_reload():
+    token, calls = ["a"], []
+    source = make_source(token, calls)
+    source.get_data()
+    previous = catalog.latest_versions()["source"]
+    assert not rebuild.source_changed(source, previous)
+    assert calls == ["a"]
+
+    token[0] = "b"
+    assert rebuild.source_changed(source, previous)
+    assert calls == ["a", "b"]
+    assert source.get_data()["token"].tolist() == ["b"]
+    # the new token is catalogued with the content it was fetched with
+    assert catalog.latest_versions()["source"]["probe"] == "b"
+
+
+def test_unprobed_source_compares_content():
+    content = [1]
+    source = DataSource(
+        name="unprobed",
+        source_type=SourceType.api,
+        data_getter=lambda: DataDate(pd.DataFrame({"x": content}), DateMeta()),
+    )
+    source.get_data()
+    previous = catalog.latest_versions()["unprobed"]
+    assert not rebuild.source_changed(source, previous)
+    content[0] = 2
+    assert rebuild.source_changed(source, previous)
+
+
+def test_affected_assets(monkeypatch):
+    monkeypatch.setattr(
+        registry, "reverse_index", lambda: {"s1": ["b", "a"], "s2": ["c"]}
+    )
+    monkeypatch.setattr(registry, "asset_names", lambda: ["a", "b", "c", "d"])
+    assert rebuild.affected_assets(["s1"]) == ["a", "b"]
+    assert rebuild.affected_assets(["s1", "s2", "s3"]) == ["a", "b", "c"]
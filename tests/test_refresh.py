@@ -0,0 +1,38 @@
+import pandas as pd
+
+from artifacts import ARTIFACTS
+from models import DataAsset, DataDate, DataSource, DateMeta, SourceType
+from runner import Runner
+
+
+def test_background_refresh_is_applied_between_runs(monkeypatch):
+    versions = []
+
+    def getter():
+        versions.append(len(versions) + 1)
+        return DataDate(pd.DataFrame({"v": [versions[-1]]}), DateMeta())
+
+    source = DataSource(
+        name="source",
+        source_type=SourceType.api,
+        data_getter=getter,
+        stale_while_revalidate=True,
+        stale_window=pd.Timedelta("1 day"),
+    )
+    assert source.get_data()["v"].tolist() == [1]
+
+    # expire the artifact, so the next load serves it stale and refreshes
+    monkeypatch.setattr(ARTIFACTS, "max_age", 0)
+    source.data = None
+    assert source.get_data()["v"].tolist() == [1]
+    ARTIFACTS.refreshing[source.artifact_key].join()
+    # not swapped under whoever is reading it
+    assert source.get_data()["v"].tolist() == [1]
+
+    seen = []
+    asset = DataAsset(
+        "asset", inputs={"s": source}, processer=lambda d: seen.append(d["s"]) or d["s"]
+    )
+    Runner([asset], release_sources=False).run()
+    assert seen[0]["v"].tolist() == [2]
+    assert versions == [1, 2]
@@ -0,0 +1,44 @@
+import json
+import os
+
+import registry
+
+MANIFEST = {
+    "code_hash": "abc",
+    "assets": [
+        {"name": "a", "kind": "DataAsset", "inputs": ["s1"], "sources": ["s1"]},
+        {"name": "b", "kind": "DataAsset", "inputs": ["a"], "sources": ["s1", "s2"]},
+        {"name": "s2", "kind": "DataSource"},
+        {"name": "report", "kind": "Report", "inputs": ["a", "s2"]},
+    ],
+    "sources": [{"name": "s1"}, {"name": "s2"}],
+}
+
+
+def use_manifest(monkeypatch, manifest):
+    monkeypatch.setattr(registry, "_MANIFEST", None)
+    monkeypatch.setattr(registry, "code_hash", lambda: manifest["code_hash"])
+    os.makedirs(os.path.dirname(registry.MANIFEST), exist_ok=True)
+    with open(registry.MANIFEST, "w") as f:
+        json.dump(manifest, f)
+
+
+def test_manifest_is_kept_out_of_the_source_tree():
+    assert os.path.commonpath([registry.MANIFEST, "cachedir"]) == "cachedir"
+
+
+def test_reverse_index(monkeypatch):
+    use_manifest(monkeypatch, MANIFEST)
+    assert registry.asset_names() == ["a", "b", "s2", "report"]
+    assert registry.reverse_index() == {
+        "s1": ["a", "b", "report"],
+        "s2": ["b", "s2", "report"],
+    }
+
+
+def test_stale_manifest_is_rebuilt(monkeypatch):
+    use_manifest(monkeypatch, MANIFEST)
+    monkeypatch.setattr(registry, "code_hash", lambda: "changed")
+    rebuilt = dict(MANIFEST, code_hash="changed")
+    monkeypatch.setattr(registry, "build_manifest", lambda: rebuilt)
+    assert registry.manifest() is rebuilt
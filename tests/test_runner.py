@@ -0,0 +1,111 @@
+import os
+
+import pandas as pd
+
+from models import DataAsset, DataDate, DataSource, DateMeta, SourceType
+from runner import Runner
+
+
+def make_source(name, calls):
+    def getter():
+        calls.append(name)
+        return DataDate(pd.DataFrame({"x": range(10)}), DateMeta())
+
+    return DataSource(name=name, source_type=SourceType.api, data_getter=getter)
+
+
+def test_released_source_is_reloaded_from_spill():
+    calls = []
+    source = make_source("source", calls)
+    seen = {}
+
+    def uses_input(data):
+        return data["s"].assign(y=1)
+
+    def reads_source_directly(data):
+        seen["spill_path"] = source.spill_path
+        return source.get_data().assign(z=2)
+
+    first = DataAsset("first", inputs={"s": source}, processer=uses_input)
+    second = DataAsset("second", inputs={}, processer=reads_source_directly)
+    Runner([first, second]).run()
+
+    # released after its only declared consumer, then read back from disk
+    assert seen["spill_path"] is not None
+    assert calls == ["source"]
+
+
+def test_failed_node_retried_releases_its_inputs():
+    attempts = []
+    runner = None
+    seen = {}
+
+    def base(data):
+        return pd.DataFrame({"x": range(5)})
+
+    def flaky(data):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("first attempt fails")
+        return data["base"]
+
+    def last(data):
+        seen["frames"] = set(runner.frames)
+        return data["flaky"]
+
+    base_asset = DataAsset("base", processer=base)
+    flaky_asset = DataAsset("flaky", inputs={"base": base_asset}, processer=flaky)
+    first = DataAsset("first", inputs={"flaky": flaky_asset}, processer=last)
+    second = DataAsset("second", inputs={"flaky": flaky_asset}, processer=last)
+    runner = Runner([first, second])
+    runner.run()
+
+    assert len(attempts) == 2
+    # base was rebuilt for the retry but has no consumers left to release it
+    assert "base" not in seen["frames"]
+    assert runner.pending["base"] == 0
+
+
+def test_budget_spills_idle_frames():
+    calls = []
+    sources = [make_source(f"source {i}", calls) for i in range(3)]
+    seen = {}
+
+    def total(data):
+        seen["total"] = sum(df["x"].sum() for df in data.values())
+        return pd.DataFrame({"x": [seen["total"]]})
+
+    asset = DataAsset(
+        "total", inputs={str(i): s for i, s in enumerate(sources)}, processer=total
+    )
+    runner = Runner([asset], memory_budget=0)
+    runner.run()
+    assert seen["total"] == 3 * 45
+    assert sorted(calls) == sorted(s.name for s in sources)
+
+
+def worker_pid(data):
+    return data["s"].assign(pid=os.getpid(), total=data["s"]["x"].sum())
+
+
+def add_one(data):
+    return data["a"].assign(x=data["a"]["x"] + 1)
+
+
+def test_cpu_bound_assets_run_in_the_pool():
+    calls = []
+    source = make_source("source", calls)
+    heavy = DataAsset(
+        "heavy", inputs={"s": source}, processer=worker_pid, cpu_bound=True
+    )
+    after = DataAsset("after", inputs={"a": heavy}, processer=add_one, cpu_bound=True)
+    runner = Runner([after, heavy], processes=2)
+    runner.run()
+
+    out = heavy.get_data()
+    assert (out["pid"] != os.getpid()).all()
+    assert out["total"].tolist() == [45] * 10
+    assert after.get_data()["x"].tolist() == list(range(1, 11))
+    assert calls == ["source"]
+    # the shared memory blocks are unlinked and the pool shut down
+    assert runner.shared == {} and runner.pool is None
@@ -0,0 +1,156 @@
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import main
+import registry
+import search
+from artifacts import ARTIFACTS
+from models import DataAsset, DataDate, DataSource, DateMeta, SourceType
+
+DOCS = pd.DataFrame(
+    {
+        "id": [1, 2, 3],
+        "name": ["Food Bank North", "Food Bank South", "Book Club"],
+        "activities": ["Food parcels", "Food and advice", None],
+        "area": [["E1"], ["E2"], ["E1", "E2"]],
+        "status": ["Registered", "Registered", "Removed"],
+    }
+)
+
+
+def build(docs, directory="index"):
+    return search.update_index(
+        docs,
+        key="id",
+        text_cols=["name", "activities"],
+        field_cols=["area", "status"],
+        name_col="name",
+        directory=directory,
+    )
+
+
+def test_tokenize():
+    assert search.tokenize("Food-Bank, food!") == [b"food", b"bank", b"food"]
+
+
+def test_match_and_filters():
+    index = build(DOCS)
+    assert search.search("food bank", index=index) == [
+        (1, "Food Bank North"),
+        (2, "Food Bank South"),
+    ]
+    assert search.search("food", {"area": "E2"}, index=index) == [
+        (2, "Food Bank South")
+    ]
+    assert search.search("club", {"status": "registered"}, index=index) == []
+    assert search.search("nothing", index=index) == []
+
+
+def test_update_reindexes_changed_documents_only():
+    build(DOCS)
+    docs = DOCS.copy()
+    docs.loc[2, "name"] = "Food Club"
+    docs = pd.concat(
+        [
+            docs.drop(index=0),
+            pd.DataFrame(
+                {
+                    "id": [4],
+                    "name": ["Food Hall"],
+                    "activities": ["meals"],
+                    "area": [["E1"]],
+                    "status": ["Registered"],
+                }
+            ),
+        ]
+    )
+    index = build(docs)
+    assert [id for id, _ in search.search("food", index=index)] == [2, 3, 4]
+    assert search.search("north", index=index) == []
+    # same as building from scratch
+    fresh = build(docs, directory="fresh")
+    assert (index.vocab == fresh.vocab).all()
+    assert (index.postings == fresh.postings).all()
+
+
+def test_unchanged_documents_load_the_saved_index():
+    build(DOCS)
+    index = build(DOCS)
+    assert not isinstance(index.postings, np.memmap)
+    assert search.search("book", index=index) == [(3, "Book Club")]
+
+
+def test_search_works_from_the_published_index():
+    source = DataSource(
+        name="docs",
+        source_type=SourceType.api,
+        data_getter=lambda: DataDate(DOCS, DateMeta()),
+    )
+    asset = DataAsset(
+        "index", inputs={"docs": source}, processer=lambda d: build(d["docs"])
+    )
+    asset.get_data()
+    # a machine that fetches the artifact has no local index directory
+    shutil.rmtree("index")
+    index = pickle.loads(pickle.dumps(asset.get_data()))
+    assert not os.path.exists("index")
+    assert search.search("bank", {"area": "e1"}, index=index) == [
+        (1, "Food Bank North")
+    ]
+
+
+def test_source_version_changes_its_key():
+    def source(version):
+        return DataSource(
+            name="main",
+            source_type=SourceType.api,
+            data_getter=lambda: None,
+            version=version,
+        )
+
+    assert source("").artifact_key == "main"
+    assert source("a,b").artifact_key != source("a,b,c").artifact_key
+
+
+def test_installed_index_is_searched_memory_mapped():
+    search.install_index(build(DOCS, directory="elsewhere"), "local")
+    assert isinstance(search.SearchIndex.load("local").postings, np.memmap)
+    assert search.search("club", directory="local") == [(3, "Book Club")]
+
+
+def test_installing_another_index_forgets_the_indexed_documents():
+    index = build(DOCS, directory="local")
+    search.install_index(index, "local")
+    assert os.path.exists(os.path.join("local", "indexed.pkl"))
+    search.install_index(build(DOCS.iloc[:2], directory="elsewhere"), "local")
+    assert not os.path.exists(os.path.join("local", "indexed.pkl"))
+    assert search.search("club", directory="local") == []
+
+
+def test_cli_installs_the_latest_published_index(monkeypatch):
+    builds = []
+
+    def processer(data):
+        builds.append(1)
+        return build(data["docs"], directory="elsewhere")
+
+    source = DataSource(
+        name="docs",
+        source_type=SourceType.api,
+        data_getter=lambda: DataDate(DOCS, DateMeta()),
+    )
+    index = DataAsset("postings", inputs={"docs": source}, processer=processer)
+    asset = DataAsset("index", inputs={"index": index}, processer=lambda d: None)
+    monkeypatch.setattr(registry, "resolve", lambda name: asset)
+    index.get_data()
+
+    # an old published index is used as it is, without rebuilding
+    monkeypatch.setattr(ARTIFACTS, "max_age", 0)
+    main.search_charities(["food", "--status", "Removed"])
+    assert search.has_index() and len(builds) == 1
+    main.search_charities(["--refresh", "food"])
+    assert len(builds) == 2
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from shared_frames import SharedFrame, decode_strings, encode_strings
+
+
+def round_trip(df):
+    shared = SharedFrame(df)
+    try:
+        return shared.to_frame()
+    finally:
+        shared.unlink()
+
+
+def test_strings_round_trip_with_nulls():
+    df = pd.DataFrame({"name": ["Bröd & Co", None, "", "Café", np.nan, "x"]})
+    result = round_trip(df)
+    assert result["name"].dropna().tolist() == ["Bröd & Co", "", "Café", "x"]
+    assert result["name"].isnull().tolist() == [False, True, False, False, True, False]
+
+
+def test_strings_holding_nul_fall_back():
+    values = np.array(["a\0b", "", "c"], dtype=object)
+    data, offsets = encode_strings(values)
+    assert offsets.tolist() == [0, 3, 3, 4]
+    assert decode_strings(data, offsets).tolist() == values.tolist()
+
+
+def test_empty_and_single_string_columns():
+    for values in [[], ["only"], [""]]:
+        data, offsets = encode_strings(np.array(values, dtype=object))
+        assert decode_strings(data, offsets).tolist() == values
+
+
+def test_other_column_kinds_round_trip():
+    df = pd.DataFrame(
+        {
+            "n": np.arange(4, dtype=np.int32),
+            "x": [0.5, np.nan, 1.5, 2.0],
+            "flag": [True, False, True, True],
+            "when": pd.date_range("2023-01-01", periods=4),
+            "kind": pd.Categorical(["a", "b", "a", None]),
+            "mixed": [1, "a", None, 2.5],
+        },
+        index=pd.Index(["w", "x", "y", "z"], name="key"),
+    )
+    result = round_trip(df)
+    pd.testing.assert_frame_equal(result, df, check_dtype=False, check_index_type=False)
+    assert result["kind"].dtype == df["kind"].dtype
+
+
+def test_empty_frame():
+    df = pd.DataFrame({"a": pd.Series([], dtype=object), "b": pd.Series([], dtype=int)})
+    result = round_trip(df)
+    assert list(result.columns) == ["a", "b"]
+    assert len(result) == 0
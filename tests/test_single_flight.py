@@ -0,0 +1,22 @@
+import utils
+from artifacts import ARTIFACTS
+
+
+def test_take_skips_the_call():
+    calls = []
+    assert utils.single_flight("t", lambda: calls.append(1), take=lambda: "done")
+    assert calls == []
+    assert utils.single_flight("t", lambda: "built", take=lambda: None) == "built"
+
+
+def test_store_build_takes_published_result():
+    calls = []
+
+    def build():
+        calls.append(1)
+        return len(calls)
+
+    assert ARTIFACTS.build("key", build) == 1
+    # published meanwhile, so a queued builder does not build again
+    assert ARTIFACTS.build("key", build) == 1
+    assert ARTIFACTS.build("key", build, max_age=0) == 2
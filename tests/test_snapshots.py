@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+import changes
+import snapshots
+
+
+def load(df, version, date):
+    delta = changes.capture("source", df, "id", version)
+    snapshots.record("source", df, "id", pd.Timestamp(date), version, delta)
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=["id", "area"])
+
+
+V1 = frame([(1, "A"), (2, "A"), (3, np.nan)])
+V2 = frame([(1, "A"), (2, "B"), (4, "B")])
+
+
+def test_only_changed_rows_are_stored():
+    load(V1, "v1", "2023-01-05")
+    load(V2, "v2", "2023-02-05")
+    rows = snapshots.history("source")
+    # 1 is stored once, still valid; 2 has a closed and an open version
+    assert len(rows) == 5
+    assert rows[rows["id"] == 2]["valid_to"].tolist() == [1, snapshots.OPEN]
+
+
+def test_as_of_rebuilds_each_snapshot():
+    load(V1, "v1", "2023-01-05")
+    load(V2, "v2", "2023-02-05")
+    as_of = snapshots.as_of("source", "2023-01-31").sort_values("id")
+    pd.testing.assert_frame_equal(as_of.reset_index(drop=True), V1)
+    latest = snapshots.as_of("source", "2023-03-01").sort_values("id")
+    pd.testing.assert_frame_equal(latest.reset_index(drop=True), V2)
+
+
+def test_counts_over_time_leave_out_missing_groups():
+    load(V1, "v1", "2023-01-05")
+    load(V2, "v2", "2023-02-05")
+    counts = snapshots.counts_over_time("source", "area", key="id")
+    assert list(counts.columns) == ["A", "B"]
+    assert counts["A"].tolist() == [2, 1]
+    assert counts["B"].tolist() == [0, 2]
@@ -0,0 +1,44 @@
+import os
+
+import pandas as pd
+import pytest
+
+import spatial
+from conftest import write_boundaries
+
+
+def test_assign_points_to_areas(boundary_file):
+    b = spatial.Boundaries.load("LTLA")
+    areas = b.assign([0.5, 1.5, 3.0, 1.0], [0.5, 0.5, 0.5, 0.5])
+    assert areas[:3].tolist() == [0, 1, -1]
+    # a point on the shared border is given one of the two areas
+    assert areas[3] in (0, 1)
+
+
+def test_boundaries_are_cached_per_file_version(boundary_file):
+    first = spatial.Boundaries.load("LTLA")
+    assert len(os.listdir(spatial.SPATIAL_DIR)) == 1
+    cached = spatial.Boundaries.load("LTLA")
+    assert cached.codes.tolist() == ["E1", "E2"]
+    assert cached.names.tolist() == ["West", "East"]
+    assert all(cached.geometries == first.geometries)
+
+    write_boundaries(boundary_file, [("E3", "North", (0, 1))])
+    edited = spatial.Boundaries.load("LTLA")
+    assert edited.codes.tolist() == ["E3"]
+    assert len(os.listdir(spatial.SPATIAL_DIR)) == 2
+
+
+def test_assign_points_frame(boundary_file):
+    lon = pd.Series([1.5, 5.0, 0.2], index=[7, 8, 9])
+    lat = pd.Series([0.5, 5.0, 0.9], index=[7, 8, 9])
+    df = spatial.assign_points(lon, lat, "LTLA")
+    assert df.index.tolist() == [7, 8, 9]
+    assert df.loc[7, "la_code"] == "E2" and df.loc[9, "la_name"] == "West"
+    assert df.loc[8].isnull().all()
+
+
+def test_missing_boundary_file_is_named():
+    # LTLA boundaries aren't in resources/
+    with pytest.raises(FileNotFoundError, match="Local_Authority_Districts"):
+        spatial.Boundaries.load("LTLA")
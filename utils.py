@@ -1,13 +1,173 @@
+import contextlib
+import hashlib
+import logging
+import os
+import tempfile
+import time
+
 import pandas as pd
 from diskcache import Cache
 
-CACHE = Cache("cachedir")
+CACHE_DIR = "cachedir"
+CACHE = Cache(CACHE_DIR)
 
 DATA_DIR = "data"
 OUTPUT_DIR = "output"
 RESOURCE_DIR = "resources"
+SPILL_DIR = os.path.join(CACHE_DIR, "spill")
+LOCK_DIR = os.path.join(CACHE_DIR, "locks")
+
+# set DATABANK_ARTIFACTS to a shared path to pull results built by others
+ARTIFACT_STORE = os.environ.get(
+    "DATABANK_ARTIFACTS", os.path.join(CACHE_DIR, "artifacts")
+)
+ARTIFACT_MAX_AGE = 24 * 60 * 60  # seconds before a published result is rebuilt
+
+# bytes of intermediate frames a full run may keep in memory before spilling
+MEMORY_BUDGET = 4 * 1024**3
 
 YEAR = pd.Timedelta("365 days")
+URL_PROBE_TTL = 5 * 60  # seconds a url's headers are reused for
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FileProbe:
+    """
+    Probe token for a local file: a hash of its contents. The hash is only
+    recomputed when the file's mtime or size change, so probing is cheap.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.stat = None
+        self.token = None
+
+    def __call__(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            # optional partner files may not have been copied in
+            return None
+        if (st.st_mtime_ns, st.st_size) != self.stat:
+            self.token = file_hash(self.path)
+            self.stat = (st.st_mtime_ns, st.st_size)
+        return self.token
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode="wb"):
+    """Open a temp file next to path and move it into place once written"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def to_pickle_atomic(obj, path):
+    with atomic_write(path) as f:
+        pd.to_pickle(obj, f)
+
+
+def url_probe(url):
+    """Probe token for a remote file: its ETag and Last-Modified headers"""
+    import requests
+
+    r = requests.head(url, allow_redirects=True, timeout=30)
+    r.raise_for_status()
+    return f"{r.headers.get('ETag', '')}|{r.headers.get('Last-Modified', '')}"
+
+
+class UrlProbe:
+    """
+    Probe token for a remote file, see url_probe. The token is reused for
+    ttl seconds, so keying artifacts on it doesn't send a HEAD request for
+    every lookup.
+    """
+
+    def __init__(self, url, ttl=URL_PROBE_TTL):
+        self.url = url
+        self.ttl = ttl
+        self.checked = None
+        self.token = None
+
+    def __call__(self):
+        now = time.monotonic()
+        if self.checked is None or now - self.checked > self.ttl:
+            self.token = url_probe(self.url)
+            self.checked = now
+        return self.token
+
+
+@contextlib.contextmanager
+def file_lock(name, directory=LOCK_DIR):
+    """Exclusive lock held across every process sharing directory"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{name}.lock"), "a+") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(1)
+        else:
+            import fcntl
+
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def single_flight(name, func, take, lock=None):
+    """
+    Call func once across concurrent processes.
+
+    Whoever gets the lock first calls func; processes that queued behind it
+    take the result it published while they waited instead of calling func
+    again. take() returns that published result, or None if there is none,
+    e.g. the artifact store's fetch.
+    """
+    with lock if lock is not None else file_lock(name):
+        result = take()
+        if result is not None:
+            logging.info(f"Using {name} built by another process")
+            return result
+        return func()
+
+
+# LAs merged into new unitary authorities since the 2019 LAD codes
+LA_CODE_CHANGES = {
+    "E06000060": ["E07000004", "E07000005", "E07000006", "E07000007"],
+    "E06000061": ["E07000150", "E07000152", "E07000153", "E07000156"],
+    "E06000062": ["E07000151", "E07000154", "E07000155"],
+}
+
+
+def current_la_codes(codes):
+    """la_codes with the LAs in LA_CODE_CHANGES replaced by their successors"""
+    successors = {old: new for new, olds in LA_CODE_CHANGES.items() for old in olds}
+    return codes.replace(successors)
 
 
 def drop_buckinghamshire_2020(df):
@@ -0,0 +1,72 @@
+import logging
+import os
+import time
+
+import registry
+from rebuild import rebuild
+from utils import DATA_DIR, RESOURCE_DIR, FileProbe
+
+WATCH_DIRS = [DATA_DIR, RESOURCE_DIR]
+WATCH_INTERVAL = 2  # seconds between polls
+
+
+def snapshot():
+    files = {}
+    for directory in WATCH_DIRS:
+        for dirpath, _, fnames in os.walk(directory):
+            for fname in fnames:
+                if fname.startswith("~$"):  # Excel lock files
+                    continue
+                path = os.path.normpath(os.path.join(dirpath, fname))
+                st = os.stat(path)
+                files[path] = (st.st_mtime_ns, st.st_size)
+    return files
+
+
+def file_sources():
+    """Local file path -> the source reading it"""
+    sources = {}
+    for entry in registry.source_entries():
+        source = registry.resolve(entry["name"])
+        if isinstance(source.probe, FileProbe):
+            sources[os.path.normpath(source.probe.path)] = source
+    return sources
+
+
+def watch(interval=WATCH_INTERVAL):
+    """
+    Keep sources read from data/ and resources/ loaded, and when one of their
+    files changes re-ingest that source and rebuild the assets depending on it.
+    """
+    sources = file_sources()
+    tokens = {}
+    for path, source in sources.items():
+        try:
+            source.get_data()
+            tokens[path] = source.probe()
+        except FileNotFoundError:
+            logging.warning(f"{path} not found, copy it into {DATA_DIR}")
+
+    before = snapshot()
+    print(f"Watching {', '.join(WATCH_DIRS)} (ctrl-c to stop)")
+    while True:
+        time.sleep(interval)
+        after = snapshot()
+        changed = sorted(
+            p for p in before.keys() | after.keys() if before.get(p) != after.get(p)
+        )
+        before = after
+
+        names = []
+        for path in changed:
+            source = sources.get(path)
+            if source is None:
+                logging.info(f"{path} changed, no source reads it")
+            elif path not in after:
+                logging.warning(f"{path} removed, keeping {source.name} as loaded")
+            elif source.probe() != tokens.get(path):
+                source.reload()
+                tokens[path] = source.probe()
+                names.append(source.name)
+        if names:
+            rebuild(names, release_sources=False)